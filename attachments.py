@@ -0,0 +1,164 @@
+# attachments.py
+
+import os
+import io
+import asyncio
+import tempfile
+import collections
+import aiohttp
+import discord
+import metrics
+
+MAX_ATTACHMENT_SIZE = 7 * 1024 * 1024
+# Attachments above this size are streamed to a temp file instead of being held in memory.
+SPOOL_THRESHOLD = int(os.getenv('ATTACHMENT_SPOOL_THRESHOLD', str(1024 * 1024)))
+# Process-wide cap on attachment bytes held in memory, across every running move.
+MEMORY_BUDGET = int(os.getenv('ATTACHMENT_MEMORY_BUDGET', str(32 * 1024 * 1024)))
+MAX_CONCURRENT_DOWNLOADS = int(os.getenv('MAX_CONCURRENT_DOWNLOADS', '4'))
+CHUNK_SIZE = 64 * 1024
+
+
+class ByteBudget:
+    """Strictly first-come-first-served: nobody overtakes a waiter, however small the request.
+
+    Otherwise later (prefetched) messages could fill the budget while the message the
+    move is waiting on can't get its bytes, and nothing would ever be released again.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._waiters = collections.deque()
+
+    async def acquire(self, amount):
+        # A request bigger than the whole budget would otherwise wait forever.
+        amount = min(amount, self.limit)
+        if not self._waiters and self.used + amount <= self.limit:
+            self.used += amount
+            return amount
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (amount, waiter)
+        self._waiters.append(entry)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just before the cancellation arrived; hand it straight back.
+                self.release(amount)
+            else:
+                self._waiters.remove(entry)
+                # We may have been the head holding everyone else up.
+                self._wake()
+            raise
+        return amount
+
+    def release(self, amount):
+        # Synchronous on purpose, so cleanup paths (including cancellation) never have to await.
+        self.used -= amount
+        self._wake()
+
+    def _wake(self):
+        """Grants the waiters at the head of the line, in order, for as long as they fit."""
+        while self._waiters:
+            amount, waiter = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            if self.used + amount > self.limit:
+                return
+            self._waiters.popleft()
+            self.used += amount
+            waiter.set_result(None)
+
+
+class SpooledAttachment:
+    """A downloaded attachment, either in memory or in a temp file."""
+
+    def __init__(self, fp, filename, reserved):
+        self.fp = fp
+        self.filename = filename
+        self.reserved = reserved
+
+    def to_file(self) -> discord.File:
+        # discord.File doesn't close file objects it doesn't own, so this can be called again for a retry.
+        self.fp.seek(0)
+        return discord.File(self.fp, filename=self.filename)
+
+
+class AttachmentTransfer:
+    """Downloads attachments for re-upload while keeping memory use predictable.
+
+    Small files are kept in memory and counted against a process-wide byte budget;
+    large ones are streamed to disk in chunks. Downloads are also capped in number,
+    so many concurrent moves can't multiply the peak memory.
+
+    `fetch_all` reserves a whole message's in-memory bytes in one step, so a message never
+    holds part of its share while waiting for the rest.
+    """
+
+    def __init__(self, memory_budget=MEMORY_BUDGET, max_downloads=MAX_CONCURRENT_DOWNLOADS):
+        self.budget = ByteBudget(memory_budget)
+        self._downloads = asyncio.Semaphore(max_downloads)
+        self.session = None
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def fetch_all(self, attachments) -> list[SpooledAttachment]:
+        """Downloads a message's attachments. On failure, nothing is left reserved or open."""
+        if not attachments:
+            return []
+        in_memory = [attachment.size if attachment.size <= SPOOL_THRESHOLD else 0 for attachment in attachments]
+        granted = await self.budget.acquire(sum(in_memory))
+        # Split the grant over the files (it is capped at the budget, so the last ones may get less).
+        shares = []
+        for size in in_memory:
+            share = min(size, granted)
+            shares.append(share)
+            granted -= share
+        tasks = [asyncio.create_task(self._fetch(attachment, size > 0, share)) for attachment, size, share in zip(attachments, in_memory, shares)]
+        try:
+            await asyncio.wait(tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.wait(tasks)
+            self.release([task.result() for task in tasks if not task.cancelled() and task.exception() is None])
+            raise
+        spooled = [task.result() for task in tasks if task.exception() is None]
+        errors = [task.exception() for task in tasks if task.exception() is not None]
+        if errors:
+            self.release(spooled)
+            raise errors[0]
+        return spooled
+
+    async def fetch(self, attachment) -> SpooledAttachment:
+        return (await self.fetch_all([attachment]))[0]
+
+    async def _fetch(self, attachment, in_memory, reserved) -> SpooledAttachment:
+        """Downloads into memory or a temp file. `reserved` bytes are given back if it fails."""
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+
+        fp = io.BytesIO() if in_memory else tempfile.TemporaryFile()
+        try:
+            async with self._downloads:
+                async with self.session.get(attachment.url) as response:
+                    response.raise_for_status()
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        fp.write(chunk)
+                        metrics.attachment_bytes.inc(len(chunk))
+        except BaseException:
+            fp.close()
+            if reserved:
+                self.budget.release(reserved)
+            raise
+        return SpooledAttachment(fp, attachment.filename, reserved)
+
+    def release(self, spooled):
+        for item in spooled:
+            item.fp.close()
+            if item.reserved:
+                self.budget.release(item.reserved)
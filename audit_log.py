@@ -0,0 +1,140 @@
+# audit_log.py
+
+import os
+import json
+import asyncio
+import itertools
+import discord
+
+# How often buffered audit embeds are sent.
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', '5'))
+# Discord's limits for the embeds of a single message.
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+
+class AuditLogSink:
+    """Buffers audit log embeds per guild and posts them in batches.
+
+    `log` only records the embed; a background loop sends up to 10 embeds per message
+    to each guild's audit channel. Every event sits in the `audit_outbox` table until
+    it has been sent, so a restart or a failed send never loses it.
+    """
+
+    def __init__(self, bot, interval=AUDIT_FLUSH_INTERVAL):
+        self.bot = bot
+        self.interval = interval
+        self._outbox = {}
+        self._pending = []
+        self._last_id = 0
+        self._sequence = itertools.count()
+        self._flush_task = None
+
+    async def load(self):
+        rows = await self.bot.config.db.fetchall("SELECT id, guild_id, embed FROM audit_outbox ORDER BY id")
+        restored = 0
+        for row in rows:
+            # Other shard processes deliver their own guilds' events.
+            if self.bot.owns_guild(row['guild_id']):
+                self._outbox.setdefault(row['guild_id'], []).append((row['id'], discord.Embed.from_dict(json.loads(row['embed']))))
+                restored += 1
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        print(f"[AUDIT_LOG][LOAD] Restored {restored} unsent audit event(s).")
+
+    async def close(self):
+        # The HTTP session is gone by now, so only make sure nothing unsent is lost.
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self._persist()
+
+    def _new_id(self):
+        """A snowflake-style ID: time-ordered, and unique across shard processes sharing the DB."""
+        process_slot = min(self.bot.shard_ids or [0]) % 1024
+        event_id = discord.utils.time_snowflake(discord.utils.utcnow()) | (process_slot << 12) | (next(self._sequence) % 4096)
+        # Never go backwards, even if the clock does or the sequence wraps within a millisecond.
+        self._last_id = max(event_id, self._last_id + 1)
+        return self._last_id
+
+    def log(self, guild_id, embed):
+        event_id = self._new_id()
+        self._outbox.setdefault(guild_id, []).append((event_id, embed))
+        self._pending.append(("INSERT INTO audit_outbox (id, guild_id, embed) VALUES (?, ?, ?)", (event_id, guild_id, json.dumps(embed.to_dict()))))
+
+    async def flush(self):
+        await self._persist()
+        for guild_id in list(self._outbox):
+            await self._flush_guild(guild_id)
+        await self._persist()
+
+    async def _flush_guild(self, guild_id):
+        config = self.bot.config.get(guild_id)
+        if not config or not config.audit_log_channel_id:
+            events = self._outbox[guild_id]
+            print(f"[AUDIT_LOG][FLUSH] ⚠️ Guild {guild_id} has no audit channel. Dropping {len(events)} event(s).")
+            self._drop(guild_id, events)
+            return
+        try:
+            channel = self.bot.get_channel(config.audit_log_channel_id) or await self.bot.fetch_channel(config.audit_log_channel_id)
+            # Events logged while a batch is in flight are picked up by the next round of this loop.
+            while self._outbox.get(guild_id):
+                batch = self._next_batch(self._outbox[guild_id])
+                await self.bot.pacer.wait('send', channel.id)
+                try:
+                    await channel.send(embeds=[embed for _, embed in batch])
+                except discord.HTTPException as e:
+                    if e.status != 400:
+                        raise
+                    # Discord rejected the embeds themselves; resending them would fail forever.
+                    print(f"[AUDIT_LOG][FLUSH] ❌ Discord rejected {len(batch)} audit event(s) for guild {guild_id}: {e}. Dropping them.")
+                self._drop(guild_id, batch)
+        except (discord.NotFound, discord.Forbidden) as e:
+            # The channel is gone or closed to us; retrying won't help.
+            events = self._outbox.get(guild_id, [])
+            print(f"[AUDIT_LOG][FLUSH] ❌ Can't post to the audit channel of guild {guild_id}: {e}. Dropping {len(events)} event(s).")
+            self._drop(guild_id, events)
+        except Exception as e:
+            print(f"[AUDIT_LOG][FLUSH] ❌ Failed to post audit events for guild {guild_id}, will retry: {e}")
+
+    @staticmethod
+    def _next_batch(events):
+        batch = [events[0]]
+        chars = len(events[0][1])
+        for event in events[1:MAX_EMBEDS_PER_MESSAGE]:
+            chars += len(event[1])
+            if chars > MAX_EMBED_CHARS_PER_MESSAGE:
+                break
+            batch.append(event)
+        return batch
+
+    def _drop(self, guild_id, events):
+        dropped = {event_id for event_id, _ in events}
+        remaining = [event for event in self._outbox.get(guild_id, []) if event[0] not in dropped]
+        if remaining:
+            self._outbox[guild_id] = remaining
+        else:
+            self._outbox.pop(guild_id, None)
+        for event_id in dropped:
+            self._pending.append(("DELETE FROM audit_outbox WHERE id = ?", (event_id,)))
+
+    async def _persist(self):
+        if not self._pending or self.bot.config.db is None:
+            return
+        pending, self._pending = self._pending, []
+        try:
+            for query, params in pending:
+                await self.bot.config.db.execute(query, params)
+            await self.bot.config.db.commit()
+        except Exception:
+            # Keep the changes (in order) for the next attempt.
+            self._pending = pending + self._pending
+            raise
+
+    async def _flush_loop(self):
+        await self.bot.wait_until_ready()
+        while True:
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[AUDIT_LOG][FLUSH] ❌ Failed to flush audit events: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,152 @@
+# backup_service.py
+
+import os
+import time
+import asyncio
+import sqlite3
+import gdrive_handler
+
+# How long the DB has to stay quiet before a backup is uploaded.
+BACKUP_DEBOUNCE = float(os.getenv('BACKUP_DEBOUNCE', '30'))
+# However often requests keep coming (a long move checkpoints constantly), a pending
+# change is uploaded no later than this many debounce windows after it was first requested.
+MAX_DELAY_WINDOWS = 10
+# How often the primary process checks for backups requested by other shard processes.
+REMOTE_POLL_INTERVAL = 10.0
+
+
+class BackupService:
+    """Uploads the database to Google Drive in the background, a while after it changes.
+
+    Callers `request()` a backup whenever state worth keeping changes (settings, jobs,
+    move queues). Requests arriving within the debounce window of each other are
+    coalesced into one upload, but a change never waits longer than MAX_DELAY_WINDOWS
+    debounce windows. One last upload is always made on shutdown. The upload reads a snapshot taken with
+    SQLite's online backup API, so it is consistent even while the bot keeps writing.
+
+    Only the primary shard process uploads. The others record their requests in
+    `bot_state`, and the primary picks them up from there.
+    """
+
+    def __init__(self, bot, credentials, folder_id, db_path, debounce=BACKUP_DEBOUNCE):
+        self.bot = bot
+        self.credentials = credentials
+        self.folder_id = folder_id
+        self.db_path = db_path
+        self.debounce = debounce
+        self._dirty = False
+        self._requested_at = 0.0
+        self._pending_since = 0.0
+        self._uploading = False
+        self._task = None
+        self._poll_task = None
+        self._remote_request = None
+
+    def start(self):
+        """Once the database is open, starts watching for other processes' requests."""
+        if self.bot.is_primary and self.bot.shard_ids is not None:
+            self._poll_task = asyncio.create_task(self._poll_remote_requests())
+
+    def request(self):
+        if not self.bot.is_primary:
+            asyncio.create_task(self._request_remote())
+            return
+        now = asyncio.get_running_loop().time()
+        if not self._dirty:
+            self._pending_since = now
+        self._dirty = True
+        self._requested_at = now
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Uploads right away instead of waiting out the debounce, pending request or not."""
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+        self.debounce = 0
+        if self._task is not None and not self._task.done():
+            if self._uploading:
+                # Let the upload in flight finish; with no debounce left, the loop picks up the rest.
+                await self._task
+            else:
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+        if self.bot.is_primary:
+            await self._backup()
+
+    async def _request_remote(self):
+        try:
+            await self.bot.config.db.execute("INSERT OR REPLACE INTO bot_state (key, value) VALUES ('backup_requested_at', ?)", (repr(time.time()),))
+            await self.bot.config.db.commit()
+        except Exception as e:
+            print(f"[BACKUP_SERVICE][REQUEST] ❌ Could not pass the backup request to the primary process: {e}")
+
+    async def _poll_remote_requests(self):
+        while True:
+            try:
+                row = await self.bot.config.db.fetchone("SELECT value FROM bot_state WHERE key = 'backup_requested_at'")
+                value = row['value'] if row else ''
+                # The first read only records where things stand; startup already synced the DB.
+                if self._remote_request is not None and value != self._remote_request:
+                    self.request()
+                self._remote_request = value
+            except Exception as e:
+                print(f"[BACKUP_SERVICE][POLL] ❌ Could not check for backup requests: {e}")
+            await asyncio.sleep(REMOTE_POLL_INTERVAL)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._dirty:
+            due = min(self._requested_at + self.debounce, self._pending_since + self.debounce * MAX_DELAY_WINDOWS)
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            if not await self._backup():
+                return
+
+    async def _backup(self):
+        # Anything requested from here on needs another round.
+        self._dirty = False
+        self._uploading = True
+        try:
+            uploaded = await asyncio.to_thread(self._snapshot_and_upload)
+        except Exception as e:
+            uploaded = False
+            print(f"[BACKUP_SERVICE][BACKUP] ❌ FAILED: {e}")
+        finally:
+            self._uploading = False
+        if not uploaded:
+            # Keep the change marked so the next request (or shutdown) tries again.
+            self._dirty = True
+        return uploaded
+
+    def _snapshot_and_upload(self):
+        service = gdrive_handler.get_drive_service(self.credentials)
+        if not service:
+            print("[BACKUP_SERVICE][BACKUP] ❌ Could not get GDrive service to start upload.")
+            return False
+        if not os.path.exists(self.db_path):
+            print("[BACKUP_SERVICE][BACKUP] No local DB to back up.")
+            return False
+        # Taken before the snapshot, so the remote copy never claims to be newer than what it holds.
+        changed_at = gdrive_handler.local_mtime(self.db_path)
+        snapshot_path = self.db_path + '.snapshot'
+        source = sqlite3.connect(self.db_path)
+        try:
+            target = sqlite3.connect(snapshot_path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+        try:
+            print("[BACKUP_SERVICE][BACKUP] Snapshot taken. Uploading...")
+            return gdrive_handler.upload_db(service, self.folder_id, snapshot_path, changed_at=changed_at)
+        finally:
+            os.remove(snapshot_path)
@@ -0,0 +1,411 @@
+# benchmarks/fake_discord.py
+
+import time
+import bisect
+import random
+import asyncio
+import datetime
+import itertools
+import discord
+from pacing import classify_route
+from metrics import route_label
+
+# Rough per-bucket limits as (requests, window in seconds), keyed by pacer lane kind.
+# These approximate what Discord hands out; they are only enforced with rate limits on.
+DEFAULT_BUCKETS = {
+    'send': (5, 2.0),
+    'bulk_delete': (1, 1.0),
+    'delete': (5, 1.0),
+    'delete_old': (1, 1.0),
+    'history': (5, 1.0),
+}
+
+HISTORY_PAGE_SIZE = 100
+# Sizes cycled through by populate(mixed_attachments=True); all small enough to be kept in memory.
+MIXED_ATTACHMENT_SIZES = (200_000, 600_000, 1_000_000)
+
+
+class _Response:
+    """Just enough of an aiohttp response for discord.HTTPException."""
+
+    def __init__(self, status, reason):
+        self.status = status
+        self.reason = reason
+
+
+def _not_found(what):
+    return discord.NotFound(_Response(404, 'Not Found'), f'Unknown {what}')
+
+
+class _Bucket:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.reset_at = 0.0
+        self.remaining = limit
+
+
+class FakeBackend:
+    """The simulated Discord API every fake object talks to.
+
+    Each call is counted per route. With `buckets`, every route has a fixed-window
+    bucket; an exhausted bucket answers 429 with a Retry-After, and the call is retried
+    after sleeping, as discord.py does. Every response (429s included) is fed to the
+    bot's pacer with the same rate-limit headers Discord would send. `time_scale`
+    shrinks the windows so large runs finish in reasonable time.
+    """
+
+    def __init__(self, pacer=None, buckets=None, time_scale=1.0, latency=0.0):
+        self.pacer = pacer
+        self.buckets = buckets
+        self.time_scale = time_scale
+        self.latency = latency
+        self.calls = {}
+        self.rate_limited = 0
+        self._buckets = {}
+        self._ids = itertools.count()
+
+    def snowflake(self, when):
+        # Unique even for messages created within the same millisecond.
+        return discord.utils.time_snowflake(when) + next(self._ids) % 4096
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    async def request(self, method, path, kind=None, key=None):
+        route = classify_route(method, path)
+        if route is not None:
+            kind, key = route
+        label = route_label(method, path)
+        while True:
+            self.calls[label] = self.calls.get(label, 0) + 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            headers = self._take(kind, key)
+            if headers.get('Retry-After') is None:
+                break
+            self.rate_limited += 1
+            if self.pacer:
+                self.pacer.observe(method, path, 429, headers)
+            await asyncio.sleep(float(headers['Retry-After']))
+        if self.pacer:
+            self.pacer.observe(method, path, 200, headers)
+
+    def _take(self, kind, key):
+        if not self.buckets or kind not in self.buckets:
+            return {}
+        bucket = self._buckets.get((kind, key))
+        if bucket is None:
+            limit, window = self.buckets[kind]
+            bucket = self._buckets[(kind, key)] = _Bucket(limit, window * self.time_scale)
+        now = time.monotonic()
+        if now >= bucket.reset_at:
+            bucket.reset_at = now + bucket.window
+            bucket.remaining = bucket.limit
+        reset_after = f"{bucket.reset_at - now:.3f}"
+        if bucket.remaining <= 0:
+            return {'Retry-After': reset_after}
+        bucket.remaining -= 1
+        return {'X-RateLimit-Remaining': str(bucket.remaining), 'X-RateLimit-Reset-After': reset_after}
+
+
+class FakeAvatar:
+    def __init__(self, url):
+        self.url = url
+
+
+class FakePermissions:
+    administrator = True
+
+
+class FakeUser:
+    def __init__(self, user_id, name):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.display_avatar = FakeAvatar(f"https://cdn.example/avatars/{user_id}.png")
+        self.mention = f"<@{user_id}>"
+        self.guild_permissions = FakePermissions()
+        self.roles = []
+
+    def __str__(self):
+        return self.name
+
+
+class FakeAttachment:
+    def __init__(self, attachment_id, size):
+        self.id = attachment_id
+        self.size = size
+        self.filename = f"file_{attachment_id}.bin"
+        # The fake session reads the size back out of the URL.
+        self.url = f"https://cdn.example/attachments/{attachment_id}/{size}"
+
+
+class FakeMessage:
+    def __init__(self, backend, channel, message_id, author, content, attachments=()):
+        self._backend = backend
+        self.channel = channel
+        self.id = message_id
+        self.author = author
+        self.content = content
+        self.attachments = list(attachments)
+        self.embeds = []
+        self.webhook_id = None
+        self.created_at = discord.utils.snowflake_time(message_id)
+
+    async def delete(self):
+        await self._backend.request('DELETE', f'/channels/{self.channel.id}/messages/{self.id}')
+        if not self.channel._remove(self.id):
+            raise _not_found('Message')
+
+
+class FakePartialMessage:
+    def __init__(self, channel, message_id):
+        self.channel = channel
+        self.id = message_id
+
+    async def delete(self):
+        await self.channel._backend.request('DELETE', f'/channels/{self.channel.id}/messages/{self.id}')
+        if not self.channel._remove(self.id):
+            raise _not_found('Message')
+
+
+class FakePost:
+    """What a send returns when asked to wait: just the created message's ID."""
+
+    def __init__(self, message_id):
+        self.id = message_id
+
+
+class FakeWebhook:
+    def __init__(self, backend, webhook_id, channel, name="MoveIt"):
+        self._backend = backend
+        self.id = webhook_id
+        self.token = None
+        self.name = name
+        self.channel = channel
+        self.posts = 0
+
+    async def send(self, content=None, *, username=None, avatar_url=None, embeds=None, files=None, thread=None, wait=False):
+        await self._backend.request('POST', f'/webhooks/{self.id}/token')
+        if files:
+            for file in files:
+                # Upload it, as far as memory is concerned.
+                file.fp.read()
+        target = thread or self.channel
+        target.posted += 1
+        self.posts += 1
+        if wait:
+            return FakePost(self._backend.snowflake(discord.utils.utcnow()))
+
+
+class FakeTextChannel(discord.TextChannel):
+    """A text channel backed by an in-memory message store.
+
+    Subclassing discord.TextChannel keeps the cogs' isinstance checks working without a
+    gateway state. Messages are kept by ID plus a sorted ID list; deleted IDs are
+    skipped while paging instead of being removed from the list, so deletes stay O(1).
+    """
+
+    def __init__(self, backend, guild, channel_id, name):
+        self._backend = backend
+        self.guild = guild
+        self.id = channel_id
+        self.name = name
+        self.posted = 0
+        self._messages = {}
+        self._ids = []
+        self._webhooks = []
+
+    def __repr__(self):
+        return f"<FakeTextChannel id={self.id} name={self.name!r}>"
+
+    def add_message(self, message):
+        self._messages[message.id] = message
+        self._ids.append(message.id)
+
+    def _remove(self, message_id):
+        return self._messages.pop(message_id, None) is not None
+
+    @property
+    def message_count(self):
+        return len(self._messages)
+
+    async def history(self, *, limit=100, before=None, after=None, around=None, oldest_first=None):
+        if oldest_first is None:
+            oldest_first = after is not None
+        low = after.id if after is not None else 0
+        high = before.id if before is not None else float('inf')
+        remaining = limit
+        while remaining is None or remaining > 0:
+            await self._backend.request('GET', f'/channels/{self.id}/messages', kind='history', key=self.id)
+            page_size = HISTORY_PAGE_SIZE if remaining is None else min(HISTORY_PAGE_SIZE, remaining)
+            if oldest_first:
+                start = bisect.bisect_right(self._ids, low)
+                stop = bisect.bisect_left(self._ids, high)
+                page = []
+                for message_id in itertools.islice(self._ids, start, stop):
+                    if message_id in self._messages:
+                        page.append(self._messages[message_id])
+                        if len(page) == page_size:
+                            break
+            else:
+                stop = bisect.bisect_left(self._ids, high)
+                start = bisect.bisect_right(self._ids, low)
+                page = []
+                for i in range(stop - 1, start - 1, -1):
+                    message_id = self._ids[i]
+                    if message_id in self._messages:
+                        page.append(self._messages[message_id])
+                        if len(page) == page_size:
+                            break
+            if not page:
+                return
+            for message in page:
+                yield message
+            if remaining is not None:
+                remaining -= len(page)
+            if len(page) < page_size:
+                return
+            if oldest_first:
+                low = page[-1].id
+            else:
+                high = page[-1].id
+
+    async def fetch_message(self, message_id):
+        await self._backend.request('GET', f'/channels/{self.id}/messages/{message_id}')
+        message = self._messages.get(message_id)
+        if message is None:
+            raise _not_found('Message')
+        return message
+
+    def get_partial_message(self, message_id):
+        return FakePartialMessage(self, message_id)
+
+    async def delete_messages(self, messages, *, reason=None):
+        await self._backend.request('POST', f'/channels/{self.id}/messages/bulk-delete')
+        for message in messages:
+            self._remove(message.id)
+
+    async def send(self, content=None, **kwargs):
+        await self._backend.request('POST', f'/channels/{self.id}/messages')
+        self.posted += 1
+        return FakePost(self._backend.snowflake(discord.utils.utcnow()))
+
+    async def webhooks(self):
+        await self._backend.request('GET', f'/channels/{self.id}/webhooks')
+        return list(self._webhooks)
+
+    async def create_webhook(self, *, name, avatar=None, reason=None):
+        await self._backend.request('POST', f'/channels/{self.id}/webhooks')
+        webhook = FakeWebhook(self._backend, self._backend.snowflake(discord.utils.utcnow()), self, name)
+        self._webhooks.append(webhook)
+        return webhook
+
+    async def delete(self, *, reason=None):
+        await self._backend.request('DELETE', f'/channels/{self.id}')
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+class FakeResponse:
+    def __init__(self):
+        self.messages = []
+
+    async def defer(self, **kwargs):
+        pass
+
+    async def send_message(self, content=None, **kwargs):
+        self.messages.append(content)
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, content=None, **kwargs):
+        self.messages.append(content)
+
+
+class FakeInteraction:
+    def __init__(self, guild, user, channel=None):
+        self.guild = guild
+        self.user = user
+        self.channel = channel
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+    async def edit_original_response(self, **kwargs):
+        pass
+
+
+class _FakeContent:
+    def __init__(self, size):
+        self.size = size
+
+    async def iter_chunked(self, chunk_size):
+        remaining = self.size
+        while remaining > 0:
+            n = min(chunk_size, remaining)
+            remaining -= n
+            yield bytes(n)
+
+
+class _FakeDownload:
+    def __init__(self, backend, url):
+        self._backend = backend
+        self.content = _FakeContent(int(url.rsplit('/', 1)[1]))
+
+    async def __aenter__(self):
+        # Attachment downloads go to the CDN, not the API, so they aren't counted as API calls.
+        if self._backend.latency:
+            await asyncio.sleep(self._backend.latency)
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeAttachmentSession:
+    """Stands in for AttachmentTransfer's aiohttp session and serves zero-filled files."""
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def get(self, url):
+        return _FakeDownload(self._backend, url)
+
+    async def close(self):
+        pass
+
+
+def populate(backend, channel, count, authors, *, attachment_every=0, attachment_size=64 * 1024, burst=1, end=None, mixed_attachments=False):
+    """Fills `channel` with `count` messages, one second apart, ending at `end` (default: now).
+
+    Authors take turns in runs of `burst` messages; every `attachment_every`-th message
+    carries one attachment of `attachment_size` bytes. With `mixed_attachments`, it
+    carries 1-4 attachments of MIXED_ATTACHMENT_SIZES instead.
+    """
+    end = end or discord.utils.utcnow()
+    # Seeded, so every run sees the same mix.
+    rng = random.Random(channel.id)
+    start = end - datetime.timedelta(seconds=count)
+    for i in range(count):
+        when = start + datetime.timedelta(seconds=i)
+        author = authors[(i // burst) % len(authors)]
+        attachments = []
+        if attachment_every and i % attachment_every == 0:
+            if mixed_attachments:
+                for _ in range(rng.randint(1, 4)):
+                    attachments.append(FakeAttachment(backend.snowflake(when), rng.choice(MIXED_ATTACHMENT_SIZES)))
+            else:
+                attachments.append(FakeAttachment(backend.snowflake(when), attachment_size))
+        message = FakeMessage(backend, channel, backend.snowflake(when), author, f"Synthetic message {i} from {author.name}.", attachments)
+        channel.add_message(message)
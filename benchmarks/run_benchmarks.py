@@ -0,0 +1,228 @@
+# benchmarks/run_benchmarks.py
+#
+# Runs /merge, /split and /queue move against a simulated Discord backend and reports
+# throughput, peak memory and API calls per moved message. Run from the repo root:
+#
+#   python -m benchmarks.run_benchmarks --sizes 1000 10000 --rate-limits --time-scale 0.01
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+
+# move_it.py validates its environment on import; the benchmarks only need its schema.
+_scratch = tempfile.mkdtemp(prefix="moveit-bench-")
+for _name, _value in {'DISCORD_TOKEN': 'benchmark', 'DB_PATH': os.path.join(_scratch, 'unused.db'), 'LOG_PATH': os.path.join(_scratch, 'discord.log'), 'GDRIVE_CREDENTIALS': '{}', 'GDRIVE_FOLDER_ID': 'benchmark'}.items():
+    os.environ.setdefault(_name, _value)
+
+from move_it import db_init
+from pacing import TransferPacer
+from jobs import JobStore, JobScheduler
+from config_service import ConfigService
+from webhook_registry import WebhookRegistry
+from attachments import AttachmentTransfer, MEMORY_BUDGET
+from move_queue_store import MoveQueueStore
+from message_index import MessageIndex
+from audit_log import AuditLogSink
+from cogs.merge_cog import MergeCog
+from cogs.split_cog import SplitCog
+from cogs.move_queue_cog import MoveQueueCog
+from benchmarks.fake_discord import (
+    DEFAULT_BUCKETS, FakeBackend, FakeTextChannel, FakeGuild, FakeUser, FakeInteraction, FakeAttachmentSession, populate,
+)
+
+GUILD_ID = 1
+MODERATOR_ID = 2
+
+
+class _FakeTree:
+    def add_command(self, command):
+        pass
+
+
+class _NoBackups:
+    def request(self):
+        pass
+
+
+class BenchBot:
+    """The services a MoveItBot carries, wired to the fake backend instead of Discord."""
+
+    # A single, unsharded process.
+    shard_ids = None
+
+    def __init__(self, backend, db_path, webhook_pool=1, memory_budget=MEMORY_BUDGET):
+        self.pacer = TransferPacer()
+        self.tree = _FakeTree()
+        self.config = ConfigService()
+        self.job_store = JobStore(self)
+        self.scheduler = JobScheduler(self)
+        self.webhooks = WebhookRegistry(self, persist=False, pool_size=webhook_pool)
+        self.attachments = AttachmentTransfer(memory_budget=memory_budget)
+        self.attachments.session = FakeAttachmentSession(backend)
+        self.move_queue = MoveQueueStore(self)
+        self.message_index = MessageIndex(self, enabled=False)
+        self.audit = AuditLogSink(self)
+        self.backups = _NoBackups()
+        self.backend = backend
+        self.db_path = db_path
+        self.channels = {}
+        backend.pacer = self.pacer
+
+    async def start(self):
+        await self.config.open(self.db_path)
+        await db_init(self.config.db)
+        await self.config.load()
+        await self.move_queue.load()
+
+    async def close(self):
+        await self.move_queue.close()
+        await self.config.close()
+
+    def add_channel(self, channel):
+        self.channels[channel.id] = channel
+        return channel
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def owns_guild(self, guild_id):
+        return True
+
+    async def fetch_channel(self, channel_id):
+        return self.channels[channel_id]
+
+    async def wait_until_ready(self):
+        pass
+
+    async def wait_for_jobs(self):
+        while self.scheduler.running_count or self.scheduler.queued_count:
+            await asyncio.sleep(0.01)
+
+
+async def _setup(args, size):
+    backend = FakeBackend(buckets=DEFAULT_BUCKETS if args.rate_limits else None, time_scale=args.time_scale, latency=args.latency)
+    bot = BenchBot(backend, os.path.join(tempfile.mkdtemp(dir=_scratch), 'bench.db'), webhook_pool=args.webhook_pool, memory_budget=args.memory_budget)
+    await bot.start()
+    guild = FakeGuild(GUILD_ID)
+    audit = bot.add_channel(FakeTextChannel(backend, guild, 10, 'audit-log'))
+    await bot.config.set_guild_config(GUILD_ID, audit.id, "")
+    authors = [FakeUser(100 + i, f"user{i}") for i in range(args.authors)]
+    # One source/target pair (and moderator) per concurrent move; they share the bot's budgets.
+    moves = []
+    for i in range(args.jobs):
+        source = bot.add_channel(FakeTextChannel(backend, guild, 1000 + 2 * i, f'source-{i}'))
+        target = bot.add_channel(FakeTextChannel(backend, guild, 1001 + 2 * i, f'target-{i}'))
+        populate(backend, source, size, authors, attachment_every=args.attachment_every, attachment_size=args.attachment_size, burst=args.burst, mixed_attachments=args.mixed_attachments)
+        moves.append((source, target, FakeInteraction(guild, FakeUser(MODERATOR_ID + i, f'moderator{i}'), source)))
+    return bot, moves
+
+
+async def run_merge(bot, source, target, interaction, args):
+    await MergeCog(bot)._execute_merge(interaction, source, target, False, compact=args.compact)
+
+
+async def run_split(bot, source, target, interaction, args):
+    ids = source._ids
+    cog = SplitCog(bot)
+    await cog.split_command.callback(cog, interaction, str(ids[0]), target, str(ids[-1]), compact=args.compact)
+
+
+async def run_queue(bot, source, target, interaction, args):
+    # Every other message, so the queue resolver has gaps to page around.
+    bot.move_queue.max_size = len(source._ids)
+    for message_id in source._ids[::2]:
+        bot.move_queue.add(GUILD_ID, interaction.user.id, source.id, message_id)
+    cog = MoveQueueCog(bot)
+    await cog.move_queue_command.callback(cog, interaction, target, compact=args.compact)
+
+
+SCENARIOS = {'merge': run_merge, 'split': run_split, 'queue': run_queue}
+
+
+async def _run_to_completion(bot, name, moves, args):
+    await asyncio.gather(*(SCENARIOS[name](bot, source, target, interaction, args) for source, target, interaction in moves))
+    await bot.wait_for_jobs()
+
+
+async def bench(name, size, args):
+    bot, moves = await _setup(args, size)
+    before = sum(source.message_count for source, _, _ in moves)
+    calls_before = bot.backend.total_calls
+    if args.tracemalloc:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        try:
+            await asyncio.wait_for(_run_to_completion(bot, name, moves, args), args.timeout)
+        except asyncio.TimeoutError:
+            budget = bot.attachments.budget
+            posted = sum(target.posted for _, target, _ in moves)
+            raise SystemExit(f"{name} {size}: no progress after {args.timeout:.0f}s ({posted} posts, budget used {budget.used}/{budget.limit}, {len(budget._waiters)} waiting). Stuck?")
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else 0
+    finally:
+        if args.tracemalloc:
+            tracemalloc.stop()
+    moved = before - sum(source.message_count for source, _, _ in moves)
+    calls = bot.backend.total_calls - calls_before
+    result = {
+        'scenario': name,
+        'size': size,
+        'moved': moved,
+        'posts': sum(target.posted for _, target, _ in moves),
+        'seconds': elapsed,
+        'msgs_per_sec': moved / elapsed if elapsed else 0.0,
+        'peak_mb': peak / (1024 * 1024),
+        'calls': calls,
+        'calls_per_msg': calls / moved if moved else 0.0,
+        'rate_limited': bot.backend.rate_limited,
+        'routes': dict(bot.backend.calls),
+    }
+    await bot.close()
+    return result
+
+
+def _print(result, verbose):
+    print(f"{result['scenario']:>6} {result['size']:>7} | moved {result['moved']:>7} in {result['posts']:>7} post(s) | "
+          f"{result['seconds']:8.2f}s {result['msgs_per_sec']:9.1f} msg/s | peak {result['peak_mb']:7.1f} MB | "
+          f"{result['calls_per_msg']:.3f} calls/msg ({result['calls']} calls, {result['rate_limited']} 429s)")
+    if verbose:
+        for route, count in sorted(result['routes'].items(), key=lambda item: -item[1]):
+            print(f"           {count:>8}  {route}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark MoveIt's move pipeline against a simulated Discord backend.")
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=['merge', 'split', 'queue'])
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000])
+    parser.add_argument('--authors', type=int, default=5, help="Distinct authors in the synthetic channel.")
+    parser.add_argument('--burst', type=int, default=3, help="Consecutive messages per author before the next one speaks.")
+    parser.add_argument('--attachment-every', type=int, default=20, help="Every Nth message has an attachment (0 for none).")
+    parser.add_argument('--attachment-size', type=int, default=256 * 1024)
+    parser.add_argument('--mixed-attachments', action='store_true', help="Give attachment messages 1-4 files of 0.2, 0.6 or 1 MB instead.")
+    parser.add_argument('--memory-budget', type=int, default=MEMORY_BUDGET, help="Attachment memory budget in bytes (try a small one with --mixed-attachments).")
+    parser.add_argument('--timeout', type=float, default=3600.0, help="Give up (and report a hang) after this many seconds per run.")
+    parser.add_argument('--jobs', type=int, default=1, help="Concurrent moves per run, each with its own source and target.")
+    parser.add_argument('--compact', action='store_true', help="Run the moves in compact mode.")
+    parser.add_argument('--webhook-pool', type=int, default=1, help="Webhooks per destination to rotate reposts through.")
+    parser.add_argument('--rate-limits', action='store_true', help="Enforce per-route buckets and answer 429s.")
+    parser.add_argument('--time-scale', type=float, default=1.0, help="Multiplier for bucket windows (e.g. 0.01 to run 100x faster).")
+    parser.add_argument('--latency', type=float, default=0.0, help="Simulated seconds per API call.")
+    parser.add_argument('--no-tracemalloc', dest='tracemalloc', action='store_false', help="Skip peak memory tracking (it slows Python down).")
+    parser.add_argument('--verbose', action='store_true', help="Show API calls per route.")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    for size in args.sizes:
+        for name in args.scenarios:
+            _print(await bench(name, size, args), args.verbose)
+
+
+if __name__ == '__main__':
+    asyncio.run(main(sys.argv[1:]))
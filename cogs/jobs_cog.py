@@ -0,0 +1,75 @@
+# cogs/jobs_cog.py
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+
+class JobsCog(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """A global check for all commands in this cog."""
+        return await self.bot.config.check_interaction(interaction)
+
+    def _find_job(self, interaction: discord.Interaction, job_id: int):
+        job = self.bot.scheduler.get(job_id)
+        if job is None or job.guild_id != interaction.guild.id:
+            return None
+        return job
+
+    jobs_group = app_commands.Group(name="jobs", description="View and control running move jobs.")
+
+    @jobs_group.command(name="list", description="List the running and queued move jobs in this server.")
+    async def list_jobs(self, interaction: discord.Interaction):
+        jobs = self.bot.scheduler.jobs(interaction.guild.id)
+        if not jobs:
+            await interaction.response.send_message("There are no running or queued jobs in this server.", ephemeral=True)
+            return
+        lines = []
+        for job, running in jobs[:25]:
+            state = "⏸️ paused" if job.paused else ("▶️ running" if running else "⏳ queued")
+            lines.append(f"**#{job.id}** `{job.kind}` by <@{job.user_id}> — {state}, {job.moved_count} message(s) moved")
+        embed = discord.Embed(title="MoveIt Jobs", color=discord.Color.blurple(), description="\n".join(lines))
+        embed.set_footer(text=f"{self.bot.scheduler.running_count} running, {self.bot.scheduler.queued_count} queued across all servers")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @jobs_group.command(name="pause", description="Pause a running or queued job.")
+    @app_commands.describe(job_id="The job number shown by /jobs list.")
+    async def pause_job(self, interaction: discord.Interaction, job_id: int):
+        job = self._find_job(interaction, job_id)
+        if job is None:
+            await interaction.response.send_message(f"❌ No active job #{job_id} in this server.", ephemeral=True)
+            return
+        job.pause()
+        await interaction.response.send_message(f"⏸️ Job #{job_id} paused. It will stop after the message it is currently moving.", ephemeral=True)
+
+    @jobs_group.command(name="resume", description="Resume a paused job.")
+    @app_commands.describe(job_id="The job number shown by /jobs list.")
+    async def unpause_job(self, interaction: discord.Interaction, job_id: int):
+        job = self._find_job(interaction, job_id)
+        if job is None:
+            await interaction.response.send_message(f"❌ No active job #{job_id} in this server.", ephemeral=True)
+            return
+        self.bot.scheduler.unpause(job_id)
+        await interaction.response.send_message(f"▶️ Job #{job_id} resumed.", ephemeral=True)
+
+    @jobs_group.command(name="cancel", description="Cancel a running or queued job. Messages already moved stay moved.")
+    @app_commands.describe(job_id="The job number shown by /jobs list.")
+    async def cancel_job(self, interaction: discord.Interaction, job_id: int):
+        job = self._find_job(interaction, job_id)
+        if job is None:
+            await interaction.response.send_message(f"❌ No active job #{job_id} in this server.", ephemeral=True)
+            return
+        self.bot.scheduler.cancel(job_id)
+        await interaction.response.send_message(f"🛑 Job #{job_id} cancelled. {job.moved_count} message(s) had already been moved.", ephemeral=True)
+
+        log_embed = discord.Embed(title="Job Cancelled", color=discord.Color.red(), description=f"Job **#{job_id}** (`{job.kind}`) was cancelled.", timestamp=discord.utils.utcnow())
+        log_embed.add_field(name="Cancelled By", value=interaction.user.mention, inline=True)
+        log_embed.add_field(name="Started By", value=f"<@{job.user_id}>", inline=True)
+        log_embed.set_footer(text="MoveIt Audit Log")
+        self.bot.audit.log(interaction.guild.id, log_embed)
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(JobsCog(bot))
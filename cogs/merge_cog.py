@@ -1,24 +1,10 @@
 # cogs/merge_cog.py
 
-import os
 import discord
-import asqlite
-import asyncio
-import io
 from discord import app_commands, ui
 from discord.ext import commands
+from transfer import MessageTransfer, TransferError, prepend
 
-DB_PATH = os.getenv('DB_PATH')
-MAX_ATTACHMENT_SIZE = 7 * 1024 * 1024
-
-async def log_to_audit_channel(bot, guild_id, log_message):
-    async with asqlite.connect(DB_PATH) as conn:
-        config = await conn.fetchone("SELECT audit_log_channel_id FROM guild_configs WHERE guild_id = ?", (guild_id,))
-    if config and config['audit_log_channel_id']:
-        try:
-            log_channel = bot.get_channel(config['audit_log_channel_id']) or await bot.fetch_channel(config['audit_log_channel_id'])
-            await log_channel.send(embed=log_message)
-        except: pass
 
 class ConfirmView(ui.View):
     def __init__(self, author: discord.User):
@@ -46,11 +32,12 @@ class MergeCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
-    async def _execute_merge(self, interaction: discord.Interaction, source: discord.TextChannel, target: discord.TextChannel, delete_source: bool, thread_name: str = None):
-        source_channel_name = source.name
+    async def _execute_merge(self, interaction: discord.Interaction, source: discord.TextChannel, target: discord.TextChannel, delete_source: bool, thread_name: str = None, compact: bool = False):
         try:
-            all_messages = [message async for message in source.history(limit=None, oldest_first=True)]
-            if not all_messages:
+            # Stream the history page by page rather than loading the whole channel up front.
+            history = source.history(limit=None, oldest_first=True)
+            first_message = await anext(history, None)
+            if first_message is None:
                 await interaction.followup.send("Source channel is empty.", ephemeral=True)
                 return
             
@@ -70,87 +57,66 @@ class MergeCog(commands.Cog):
                     return
 
             # Webhook is always created in the parent channel
-            webhooks = await target.webhooks()
-            webhook = discord.utils.get(webhooks, name="MoveIt") or await target.create_webhook(name="MoveIt")
-            moved_count = 0
+            webhook = await self.bot.webhooks.get(target)
+
+            spec = {'source_id': source.id, 'target_id': target.id, 'destination_id': destination.id, 'delete_source': delete_source, 'compact': compact}
+            job = await self.bot.job_store.create('merge', interaction.guild.id, interaction.user.id, spec)
+            messages = prepend(first_message, history)
+            ahead = self.bot.scheduler.submit(job, lambda: self._run_merge(job, source, target, destination, webhook, messages, interaction))
+            if ahead:
+                await interaction.followup.send(f"⏳ This move is queued as job #{job.id} behind {ahead} other job(s). It will start automatically.", ephemeral=True)
+        except Exception as e:
+            await interaction.followup.send(f"An unexpected error occurred during merge setup: `{e}`", ephemeral=True)
 
-            for i, message in enumerate(all_messages):
-                try:
-                    # Define the message state as a tuple for pattern matching
-                    message_state = (bool(message.content), bool(message.attachments), bool(message.embeds), bool(message.webhook_id))
-
-                    match message_state:
-                        # Case 1: Any message from a webhook
-                        case (_, _, _, True):
-                            quote_embed = discord.Embed(description=message.content, timestamp=message.created_at)
-                            quote_embed.set_author(name=message.author.display_name, icon_url=message.author.display_avatar.url)
-                            quote_embed.set_footer(text=f"Original message from #{source_channel_name}")
-                            await destination.send(embeds=[quote_embed] + message.embeds)
-                            moved_count += 1
-
-                        # Case 2: A regular user message with any combination of content, embeds, or attachments
-                        case (True, _, _, False) | (_, True, _, False) | (_, _, True, False):
-                            files_to_send = []
-                            content_with_links = message.content
-                            if message.attachments:
-                                for attachment in message.attachments:
-                                    if attachment.size > MAX_ATTACHMENT_SIZE:
-                                        content_with_links += f"\n\n**(Attachment too large to move:** `{attachment.filename}`\n{attachment.url} **)**"
-                                    else:
-                                        buffer = io.BytesIO(await attachment.read())
-                                        files_to_send.append(discord.File(buffer, filename=attachment.filename))
-                            
-                            send_kwargs = {
-                                'content': content_with_links,
-                                'username': message.author.display_name,
-                                'avatar_url': message.author.display_avatar.url,
-                                'embeds': message.embeds,
-                                'files': files_to_send
-                            }
-                            
-                            if isinstance(destination, discord.Thread):
-                                send_kwargs['thread'] = destination
-                            
-                            await webhook.send(**send_kwargs)
-                            moved_count += 1
-                        
-                        # Case 3 (Default): An unsendable message (e.g., sticker).
-                        case _:
-                            print(f"Skipping unsendable message (ID: {message.id}).")
-                            pass # Do nothing, just proceed to delete it
-
-                    await message.delete()
-                    await asyncio.sleep(1)
-
-                except Exception as e:
-                    error_message = f"❌ A critical error occurred while moving message #{i+1}. **The merge has been aborted.**\n\n**Error:** `{e}`\n\nThe source channel has NOT been deleted."
-                    await interaction.followup.send(error_message, ephemeral=True)
-                    return
-            
-            # This part is only reached if the loop completes without any errors.
-            if delete_source:
-                await source.delete(reason=f"Merged into #{target.name} by {interaction.user}")
-            
-            final_destination = destination.mention
+    async def _run_merge(self, job, source, target, destination, webhook, messages, interaction: discord.Interaction = None):
+        """Moves the messages and wraps up. Without an interaction (a resumed job) nobody is waiting for followups."""
+        source_channel_name = source.name
+        moderator_mention = f"<@{job.user_id}>"
+        transfer = MessageTransfer(self.bot, destination, webhook, job=job, compact=job.spec.get('compact', False))
+        try:
+            moved_count = await transfer.run(messages)
+        except TransferError as e:
+            await self.bot.job_store.finish(job, 'failed')
+            if interaction:
+                error_message = f"❌ A critical error occurred while moving message #{e.position}. **The merge has been aborted.**\n\n**Error:** `{e.original}`\n\nThe source channel has NOT been deleted."
+                await interaction.followup.send(error_message, ephemeral=True)
+            return
+        await self.bot.job_store.finish(job)
+
+        # This part is only reached if the loop completes without any errors.
+        if job.spec['delete_source']:
+            await source.delete(reason=f"Merged into #{target.name} by {interaction.user if interaction else moderator_mention}")
+
+        final_destination = destination.mention
+        if interaction:
             final_message = f"✅ Successfully merged **{moved_count}** message(s) from `#{source_channel_name}` into {final_destination}."
-            if delete_source: final_message += f"\n\nThe `#{source_channel_name}` channel has been deleted."
+            if job.spec['delete_source']: final_message += f"\n\nThe `#{source_channel_name}` channel has been deleted."
 
             # This followup is sent to the user who ran the command, and the previous one is edited.
             await interaction.followup.send(final_message, ephemeral=True)
 
-            # This message is sent to the destination channel/thread
-            await destination.send(f"✅ This channel/thread has been successfully merged with `#{source_channel_name}` by {interaction.user.mention}.")
-            
-            log_embed = discord.Embed(title="Channel Merge Complete", color=discord.Color.orange(), description=f"**Moderator:** {interaction.user.mention}\n**Source:** `#{source_channel_name}`\n**Target:** {final_destination}\n**Messages Moved:** {moved_count}", timestamp=discord.utils.utcnow())
-            log_embed.set_footer(text="MoveIt Audit Log")
-            await log_to_audit_channel(self.bot, interaction.guild.id, log_embed)
-        except Exception as e:
-            await interaction.followup.send(f"An unexpected error occurred during merge setup: `{e}`", ephemeral=True)
+        # This message is sent to the destination channel/thread
+        await destination.send(f"✅ This channel/thread has been successfully merged with `#{source_channel_name}` by {moderator_mention}.")
+
+        log_embed = discord.Embed(title="Channel Merge Complete", color=discord.Color.orange(), description=f"**Moderator:** {moderator_mention}\n**Source:** `#{source_channel_name}`\n**Target:** {final_destination}\n**Messages Moved:** {moved_count}", timestamp=discord.utils.utcnow())
+        if not interaction:
+            log_embed.add_field(name="Note", value=f"Resumed after a restart (job #{job.id}).", inline=False)
+        log_embed.add_field(name="Timings", value=transfer.timer.summary(), inline=False)
+        log_embed.set_footer(text="MoveIt Audit Log")
+        self.bot.audit.log(job.guild_id, log_embed)
+
+    async def resume_job(self, job):
+        source = self.bot.get_channel(job.spec['source_id']) or await self.bot.fetch_channel(job.spec['source_id'])
+        target = self.bot.get_channel(job.spec['target_id']) or await self.bot.fetch_channel(job.spec['target_id'])
+        destination = self.bot.get_channel(job.spec['destination_id']) or await self.bot.fetch_channel(job.spec['destination_id'])
+        webhook = await self.bot.webhooks.get(target)
+        history = source.history(limit=None, after=job.resume_after, oldest_first=True)
+        self.bot.scheduler.submit(job, lambda: self._run_merge(job, source, target, destination, webhook, history))
 
     @app_commands.command(name="merge", description="[ADMIN ONLY] Moves all messages from a source channel to a target channel.")
-    @app_commands.describe(source_channel="The channel to move messages FROM.", target_channel="The channel to move messages TO.", delete_source_channel="[DANGEROUS] Delete the source channel after the merge? (Default: False)", thread_name="[OPTIONAL] Create a new thread for these messages.")
+    @app_commands.describe(source_channel="The channel to move messages FROM.", target_channel="The channel to move messages TO.", delete_source_channel="[DANGEROUS] Delete the source channel after the merge? (Default: False)", thread_name="[OPTIONAL] Create a new thread for these messages.", compact="[OPTIONAL] Pack consecutive messages from the same author into one post. (Default: False)")
     @app_commands.checks.has_permissions(administrator=True)
-    async def merge_command(self, interaction: discord.Interaction, source_channel: discord.TextChannel, target_channel: discord.TextChannel, delete_source_channel: bool = False, thread_name: str = None):
+    async def merge_command(self, interaction: discord.Interaction, source_channel: discord.TextChannel, target_channel: discord.TextChannel, delete_source_channel: bool = False, thread_name: str = None, compact: bool = False):
         if source_channel.id == target_channel.id:
             await interaction.response.send_message("❌ Source and target channels cannot be the same.", ephemeral=True)
             return
@@ -163,7 +129,7 @@ class MergeCog(commands.Cog):
         await view.wait()
         if view.value is True:
             await view.interaction.followup.send("Merge confirmed. This may take a long time for large channels. Please be patient.", ephemeral=True)
-            await self._execute_merge(interaction, source_channel, target_channel, delete_source_channel, thread_name)
+            await self._execute_merge(interaction, source_channel, target_channel, delete_source_channel, thread_name, compact)
         elif view.value is False:
             await interaction.followup.send("Merge cancelled.", ephemeral=True)
         else:
@@ -0,0 +1,123 @@
+# cogs/move_by_user_cog.py
+
+import discord
+from discord import app_commands, abc as discord_abc
+from discord.ext import commands
+from transfer import MessageTransfer, TransferError, prepend
+from message_source import snowflake_since, stream_by_author, stream_ids
+
+
+# Values are the window length in seconds; 0 means the whole channel.
+TIME_LIMITS = [
+    app_commands.Choice(name="Last Hour", value=3600),
+    app_commands.Choice(name="Last 24 Hours", value=86400),
+    app_commands.Choice(name="Last 7 Days", value=604800),
+    app_commands.Choice(name="Last 30 Days", value=2592000),
+    app_commands.Choice(name="All Time", value=0),
+]
+
+class MoveByUserCog(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """A global check for all commands in this cog."""
+        return await self.bot.config.check_interaction(interaction)
+
+    @app_commands.command(name="movebyuser", description="Moves all messages by a specific member from a channel.")
+    @app_commands.describe(user="The user whose messages to move.", source_channel="The channel to search in.", target_channel="The destination channel.", time_limit="[OPTIONAL] Only move messages from this window. (Default: All Time)", thread_name="[OPTIONAL] Create a new thread for these messages.", compact="[OPTIONAL] Pack consecutive messages from the same author into one post. (Default: False)")
+    @app_commands.choices(time_limit=TIME_LIMITS)
+    async def move_by_user_command(self, interaction: discord.Interaction, user: discord.User, source_channel: discord.TextChannel, target_channel: discord_abc.GuildChannel, time_limit: app_commands.Choice[int] = None, thread_name: str = None, compact: bool = False):
+        if not isinstance(target_channel, (discord.TextChannel, discord.Thread, discord.ForumChannel)):
+            await interaction.response.send_message("❌ You can only move messages to a text channel, thread, or forum.", ephemeral=True)
+            return
+        target_parent = target_channel.parent if isinstance(target_channel, discord.Thread) else target_channel
+        if source_channel.id in (target_channel.id, getattr(target_parent, 'id', None)):
+            await interaction.response.send_message("❌ Source and target channels cannot be the same.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        # The window becomes a snowflake lower bound, so history only reads pages inside it.
+        after_id = snowflake_since(time_limit.value) if time_limit and time_limit.value else None
+        try:
+            indexed_ids = await self.bot.message_index.author_messages(source_channel.id, user.id, after_id)
+            if indexed_ids is not None:
+                # The index already knows which messages match, so only those are fetched, a page at a time.
+                history = stream_ids(self.bot, source_channel.id, indexed_ids)
+            else:
+                history = stream_by_author(source_channel, user.id, after_id)
+            first_message = await anext(history, None)
+            messages = prepend(first_message, history)
+        except discord.Forbidden:
+            await interaction.followup.send(f"❌ I can't read the history of {source_channel.mention}.", ephemeral=True)
+            return
+        if first_message is None:
+            window = time_limit.name.lower() if time_limit and time_limit.value else "the channel's history"
+            await interaction.followup.send(f"No messages by {user.mention} found in {source_channel.mention} ({window}).", ephemeral=True)
+            return
+
+        try:
+            webhook = await self.bot.webhooks.get(target_channel)
+        except (discord.Forbidden, AttributeError):
+            await interaction.followup.send("❌ I don't have permission to manage webhooks in that channel.", ephemeral=True)
+            return
+
+        destination = target_channel
+        if thread_name:
+            if not isinstance(target_channel, (discord.TextChannel, discord.ForumChannel)):
+                await interaction.followup.send("❌ You can only create threads in a normal text channel or a forum.", ephemeral=True)
+                return
+            try:
+                destination = await target_channel.create_thread(
+                    name=thread_name,
+                    type=discord.ChannelType.public_thread,
+                    reason=f"Moved by {interaction.user}"
+                )
+            except discord.Forbidden:
+                await interaction.followup.send("❌ I don't have permission to create threads in that channel.", ephemeral=True)
+                return
+
+        spec = {'source_id': source_channel.id, 'author_id': user.id, 'after_id': after_id, 'destination_id': destination.id, 'compact': compact}
+        job = await self.bot.job_store.create('movebyuser', interaction.guild.id, interaction.user.id, spec)
+        ahead = self.bot.scheduler.submit(job, lambda: self._run_move_by_user(job, source_channel, destination, webhook, messages, interaction))
+        if ahead:
+            await interaction.followup.send(f"⏳ This move is queued as job #{job.id} behind {ahead} other job(s). It will start automatically.", ephemeral=True)
+
+    async def _run_move_by_user(self, job, source, destination, webhook, messages, interaction: discord.Interaction = None):
+        """Moves the author's messages and wraps up. Without an interaction (a resumed job) nobody is waiting for followups."""
+        transfer = MessageTransfer(self.bot, destination, webhook, job=job, compact=job.spec.get('compact', False))
+        try:
+            moved_count = await transfer.run(messages)
+        except TransferError as e:
+            await self.bot.job_store.finish(job, 'failed')
+            if interaction:
+                await interaction.followup.send(f"❌ An error occurred while moving message #{e.position}. **The move has been stopped.**\n\n**Error:** `{e.original}`", ephemeral=True)
+            return
+        await self.bot.job_store.finish(job)
+
+        final_destination = f"thread **{destination.name}**" if isinstance(destination, discord.Thread) else destination.mention
+        if interaction:
+            await interaction.followup.send(f"✅ Successfully moved **{moved_count}** message(s) by <@{job.spec['author_id']}> to {final_destination}.", ephemeral=True)
+
+        log_embed = discord.Embed(title="Messages Moved By User", color=discord.Color.green(), description=f"**{moved_count}** message(s) by <@{job.spec['author_id']}> were moved.", timestamp=discord.utils.utcnow())
+        log_embed.add_field(name="Moderator", value=f"<@{job.user_id}>", inline=True)
+        log_embed.add_field(name="Destination", value=final_destination, inline=True)
+        log_embed.add_field(name="Source", value=f"#{source.name}", inline=False)
+        if not interaction:
+            log_embed.add_field(name="Note", value=f"Resumed after a restart (job #{job.id}).", inline=False)
+        log_embed.add_field(name="Timings", value=transfer.timer.summary(), inline=False)
+        log_embed.set_footer(text="MoveIt Audit Log")
+        self.bot.audit.log(job.guild_id, log_embed)
+
+    async def resume_job(self, job):
+        source = self.bot.get_channel(job.spec['source_id']) or await self.bot.fetch_channel(job.spec['source_id'])
+        destination = self.bot.get_channel(job.spec['destination_id']) or await self.bot.fetch_channel(job.spec['destination_id'])
+        webhook = await self.bot.webhooks.get(destination)
+        # Everything up to the checkpoint is already moved, so pick the scan up right after it.
+        after_id = max(job.last_message_id or 0, job.spec['after_id'] or 0) or None
+        messages = stream_by_author(source, job.spec['author_id'], after_id)
+        self.bot.scheduler.submit(job, lambda: self._run_move_by_user(job, source, destination, webhook, messages))
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(MoveByUserCog(bot))
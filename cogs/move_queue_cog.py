@@ -1,33 +1,11 @@
 # cogs/move_queue_cog.py
 
-import os
 import discord
-import asqlite
-import asyncio
-import io
 from discord import app_commands, abc as discord_abc
 from discord.ext import commands
+from transfer import MessageTransfer, TransferError
+from message_source import resolve_queued
 
-# --- Load environment variables needed ---
-DB_PATH = os.getenv('DB_PATH')
-
-MAX_ATTACHMENT_SIZE = 7 * 1024 * 1024
-# --- This dictionary stores (channel_id, message_id) tuples ---
-move_queue = {}
-
-async def log_to_audit_channel(bot, guild_id, log_message):
-    """Fetches the audit log channel and sends a message."""
-    async with asqlite.connect(DB_PATH) as conn:
-        config = await conn.fetchone("SELECT audit_log_channel_id FROM guild_configs WHERE guild_id = ?", (guild_id,))
-    
-    # Use dictionary-style access, which is correct for sqlite3.Row
-    if config and config['audit_log_channel_id']:
-        try:
-            log_channel = bot.get_channel(config['audit_log_channel_id']) or await bot.fetch_channel(config['audit_log_channel_id'])
-            await log_channel.send(embed=log_message)
-        except (discord.NotFound, discord.Forbidden):
-            # Fail silently if the log channel has issues
-            pass
 
 # --- Main Cog Class ---
 class MoveQueueCog(commands.Cog):
@@ -36,41 +14,22 @@ class MoveQueueCog(commands.Cog):
         self.add_to_queue_context_menu = app_commands.ContextMenu(name='Add to Move Queue', callback=self.context_menu_callback)
         self.bot.tree.add_command(self.add_to_queue_context_menu)
 
-    async def cog_check(self, interaction: discord.Interaction) -> bool:
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
         """A global check for all commands in this cog."""
-        async with asqlite.connect(DB_PATH) as conn:
-            config = await conn.fetchone("SELECT allowed_role_ids FROM guild_configs WHERE guild_id = ?", (interaction.guild.id,))
-        
-        if not config:
-            await interaction.response.send_message("❌ MoveIt has not been configured. An admin must run `/setup` first.", ephemeral=True)
-            return False
-            
-        if interaction.user.guild_permissions.administrator:
-            return True
-            
-        allowed_ids_str = config['allowed_role_ids'] or ""
-        allowed_role_ids = allowed_ids_str.split(',') if allowed_ids_str else []
-        user_role_ids = {str(role.id) for role in interaction.user.roles}
-
-        if not user_role_ids.intersection(allowed_role_ids):
-            await interaction.response.send_message("❌ You do not have the required role or permissions to use this command.", ephemeral=True)
-            return False
-
-        return True
+        return await self.bot.config.check_interaction(interaction)
 
     async def context_menu_callback(self, interaction: discord.Interaction, message: discord.Message):
         """The callback for the right-click command."""
         user_id = interaction.user.id
-        if user_id not in move_queue:
-            move_queue[user_id] = []
-        
-        message_identifier = (message.channel.id, message.id)
-        if message_identifier in move_queue[user_id]:
+        result = self.bot.move_queue.add(interaction.guild.id, user_id, message.channel.id, message.id)
+        if result == 'duplicate':
             await interaction.response.send_message("⚠️ This message is already in your queue.", ephemeral=True)
             return
+        if result == 'full':
+            await interaction.response.send_message(f"⚠️ Your queue is full ({self.bot.move_queue.max_size} messages). Move or clear it first.", ephemeral=True)
+            return
 
-        move_queue[user_id].append(message_identifier)
-        queue_count = len(move_queue[user_id])
+        queue_count = self.bot.move_queue.count(interaction.guild.id, user_id)
         await interaction.response.send_message(f"✅ Added message to queue. You now have **{queue_count}** message(s) queued.", ephemeral=True)
 
 
@@ -79,28 +38,26 @@ class MoveQueueCog(commands.Cog):
     @queue_group.command(name="view", description="View the number of messages in your queue.")
     async def view_queue(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        user_id = interaction.user.id
-        if user_id not in move_queue or not move_queue[user_id]:
+        queue_count = self.bot.move_queue.count(interaction.guild.id, interaction.user.id)
+        if not queue_count:
             await interaction.followup.send("Your move queue is currently empty.")
         else:
-            queue_count = len(move_queue[user_id])
             await interaction.followup.send(f"You have **{queue_count}** message(s) in your move queue.")
 
     @queue_group.command(name="clear", description="Clear all messages from your move queue.")
     async def clear_queue(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        user_id = interaction.user.id
-        if user_id in move_queue:
-            del move_queue[user_id]
+        self.bot.move_queue.clear(interaction.guild.id, interaction.user.id)
         await interaction.followup.send("✅ Your move queue has been cleared.")
         
     @queue_group.command(name="move", description="Moves all messages in your queue to a new location.")
-    @app_commands.describe(target_channel="The channel or thread to move the messages to.", thread_name="Optional: Create a new thread for these messages.")
+    @app_commands.describe(target_channel="The channel or thread to move the messages to.", thread_name="Optional: Create a new thread for these messages.", compact="Optional: Pack consecutive messages from the same author into one post.")
     async def move_queue_command(
         self, 
         interaction: discord.Interaction, 
         target_channel: discord_abc.GuildChannel,
-        thread_name: str = None
+        thread_name: str = None,
+        compact: bool = False
     ):
         if not isinstance(target_channel, (discord.TextChannel, discord.Thread, discord.ForumChannel)):
              await interaction.response.send_message("❌ You can only move messages to a text channel, thread, or forum.", ephemeral=True)
@@ -109,29 +66,22 @@ class MoveQueueCog(commands.Cog):
         await interaction.response.defer(ephemeral=True, thinking=True)
         
         user_id = interaction.user.id
-        if user_id not in move_queue or not move_queue[user_id]:
+        queued = self.bot.move_queue.items(interaction.guild.id, user_id)
+        if not queued:
             await interaction.followup.send("Your queue is empty.", ephemeral=True)
             return
 
-        original_messages = []
-        for channel_id, message_id in move_queue[user_id]:
-            try:
-                channel = self.bot.get_channel(channel_id) or await self.bot.fetch_channel(channel_id)
-                message = await channel.fetch_message(message_id)
-                original_messages.append(message)
-            except (discord.NotFound, discord.Forbidden):
-                continue
-        
-        original_messages.sort(key=lambda m: m.created_at)
+        original_messages = await resolve_queued(self.bot, queued)
+        # Anything that couldn't be fetched is gone for good; don't keep it around in the queue.
+        found = {(message.channel.id, message.id) for message in original_messages}
+        self.bot.move_queue.remove(interaction.guild.id, user_id, [item for item in queued if item not in found])
         
         if not original_messages:
             await interaction.followup.send("Could not fetch any of the queued messages. They may have been deleted.", ephemeral=True)
             return
 
         try:
-            parent_channel = target_channel.parent if isinstance(target_channel, discord.Thread) else target_channel
-            webhooks = await parent_channel.webhooks()
-            webhook = discord.utils.get(webhooks, name="MoveIt") or await parent_channel.create_webhook(name="MoveIt")
+            webhook = await self.bot.webhooks.get(target_channel)
         except (discord.Forbidden, AttributeError):
             await interaction.followup.send("❌ I don't have permission to manage webhooks in that channel.", ephemeral=True)
             return
@@ -151,40 +101,27 @@ class MoveQueueCog(commands.Cog):
                 await interaction.followup.send("❌ I don't have permission to create threads in that channel.", ephemeral=True)
                 return
 
-        for message in original_messages:
-            
-            files_to_send = []
-            content_with_links = message.content
-
-            if message.attachments:
-                for attachment in message.attachments:
-                    if attachment.size > MAX_ATTACHMENT_SIZE:
-                        content_with_links += f"\n\n**(Attachment too large to move:** `{attachment.filename}`\n{attachment.url} **)**"
-                    else:
-                        buffer = io.BytesIO(await attachment.read())
-                        files_to_send.append(discord.File(buffer, filename=attachment.filename))
-
-            send_kwargs = {
-                'content': content_with_links,
-                'username': message.author.display_name,
-                'avatar_url': message.author.display_avatar.url,
-                'embeds': message.embeds,
-                'files': files_to_send
-            }
-            
-            if isinstance(destination, discord.Thread):
-                send_kwargs['thread'] = destination
-            
-            await webhook.send(**send_kwargs)
+        spec = {'items': [[message.channel.id, message.id] for message in original_messages], 'destination_id': destination.id, 'compact': compact}
+        job = await self.bot.job_store.create('queue', interaction.guild.id, user_id, spec)
+        ahead = self.bot.scheduler.submit(job, lambda: self._run_queue_move(job, destination, webhook, original_messages, interaction), size=len(original_messages))
+        if ahead:
+            await interaction.followup.send(f"⏳ This move is queued as job #{job.id} behind {ahead} other job(s). It will start automatically.", ephemeral=True)
 
-            try:
-                await message.delete()
-            except (discord.NotFound, discord.Forbidden):
-                pass
-            await asyncio.sleep(1.5)
+    async def _run_queue_move(self, job, destination, webhook, original_messages, interaction: discord.Interaction = None):
+        """Moves the queued messages and wraps up. Without an interaction (a resumed job) nobody is waiting for followups."""
+        transfer = MessageTransfer(self.bot, destination, webhook, job=job, ignore_delete_errors=True, compact=job.spec.get('compact', False))
+        try:
+            moved_count = await transfer.run(original_messages)
+        except TransferError as e:
+            await self.bot.job_store.finish(job, 'failed')
+            if interaction:
+                await interaction.followup.send(f"❌ An error occurred while moving message #{e.position}. **The move has been stopped** and your queue was kept.\n\n**Error:** `{e.original}`")
+            return
+        await self.bot.job_store.finish(job)
 
         final_destination = f"thread **{destination.name}**" if isinstance(destination, discord.Thread) else destination.mention
-        await interaction.followup.send(f"✅ Successfully moved **{len(original_messages)}** message(s) to {final_destination}.")
+        if interaction:
+            await interaction.followup.send(f"✅ Successfully moved **{moved_count}** message(s) to {final_destination}.")
         
         # --- THIS IS THE FINAL FIX ---
         # Isolate the audit log in a try/except block.
@@ -193,20 +130,31 @@ class MoveQueueCog(commands.Cog):
             log_embed = discord.Embed(
                 title="Messages Moved",
                 color=discord.Color.green(),
-                description=f"**{len(original_messages)}** message(s) were moved.",
+                description=f"**{moved_count}** message(s) were moved.",
                 timestamp=discord.utils.utcnow()
             )
-            log_embed.add_field(name="Moderator", value=interaction.user.mention, inline=True)
+            log_embed.add_field(name="Moderator", value=f"<@{job.user_id}>", inline=True)
             log_embed.add_field(name="Destination", value=final_destination, inline=True)
             log_embed.add_field(name="Source(s)", value=source_channels, inline=False)
+            if not interaction:
+                log_embed.add_field(name="Note", value=f"Resumed after a restart (job #{job.id}).", inline=False)
+            log_embed.add_field(name="Timings", value=transfer.timer.summary(), inline=False)
             log_embed.set_footer(text="MoveIt Audit Log")
-            await log_to_audit_channel(self.bot, interaction.guild.id, log_embed)
+            self.bot.audit.log(job.guild_id, log_embed)
         except Exception as e:
             # If logging fails for any reason, print to console but DO NOT stop the command.
             print(f"Failed to send audit log: {e}")
 
         # This will now ALWAYS be reached after a successful move.
-        del move_queue[user_id]
+        self.bot.move_queue.remove(job.guild_id, job.user_id, [tuple(item) for item in job.spec['items']])
+
+    async def resume_job(self, job):
+        destination = self.bot.get_channel(job.spec['destination_id']) or await self.bot.fetch_channel(job.spec['destination_id'])
+        webhook = await self.bot.webhooks.get(destination)
+        # Queued items are ordered by snowflake, so everything up to the checkpoint is already done.
+        remaining = [(channel_id, message_id) for channel_id, message_id in job.spec['items'] if message_id > (job.last_message_id or 0)]
+        original_messages = await resolve_queued(self.bot, remaining)
+        self.bot.scheduler.submit(job, lambda: self._run_queue_move(job, destination, webhook, original_messages), size=len(original_messages))
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(MoveQueueCog(bot))
\ No newline at end of file
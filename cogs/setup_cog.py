@@ -1,29 +1,9 @@
 # cogs/setup_cog.py
 
-import os
 import discord
-import asqlite
 import re
-import asyncio
 from discord import app_commands
 from discord.ext import commands
-import gdrive_handler
-
-DB_PATH = os.getenv('DB_PATH')
-GDRIVE_CREDENTIALS = os.getenv('GDRIVE_CREDENTIALS')
-GDRIVE_FOLDER_ID = os.getenv('GDRIVE_FOLDER_ID')
-
-def run_gdrive_upload():
-    print("[SETUP_COG][GDRIVE_UPLOAD_BG] Starting background GDrive upload...")
-    try:
-        service = gdrive_handler.get_drive_service(GDRIVE_CREDENTIALS)
-        if service:
-            gdrive_handler.upload_db(service, GDRIVE_FOLDER_ID, DB_PATH)
-            print("[SETUP_COG][GDRIVE_UPLOAD_BG] ✅ Background upload finished.")
-        else:
-            print("[SETUP_COG][GDRIVE_UPLOAD_BG] ❌ Could not get GDrive service to start upload.")
-    except Exception as e:
-        print(f"[SETUP_COG][GDRIVE_UPLOAD_BG] ❌ FAILED: {e}")
 
 class SetupCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
@@ -44,15 +24,12 @@ class SetupCog(commands.Cog):
         
         print("[SETUP_COG][SETUP] Writing to local database...")
         try:
-            async with asqlite.connect(DB_PATH) as connection:
-                await connection.execute("INSERT OR REPLACE INTO guild_configs (guild_id, audit_log_channel_id, allowed_role_ids) VALUES (?, ?, ?)", (interaction.guild.id, audit_log_channel.id, role_ids_str))
-                await connection.commit()
+            await self.bot.config.set_guild_config(interaction.guild.id, audit_log_channel.id, role_ids_str)
             print("[SETUP_COG][SETUP] Local DB write successful.")
-            
-            print("[SETUP_COG][SETUP] Starting background GDrive upload task...")
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, run_gdrive_upload)
-            print("[SETUP_COG][SETUP] Background task created.")
+
+            # Uploaded in the background once the config stops changing; nobody waits on Drive here.
+            self.bot.backups.request()
+            print("[SETUP_COG][SETUP] GDrive backup requested.")
 
         except Exception as e:
             print(f"[SETUP_COG][SETUP] ❌ FAILED during DB operation: {e}")
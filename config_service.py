@@ -0,0 +1,77 @@
+# config_service.py
+
+import asqlite
+
+
+class GuildConfig:
+    def __init__(self, guild_id, audit_log_channel_id, allowed_role_ids):
+        self.guild_id = guild_id
+        self.audit_log_channel_id = audit_log_channel_id
+        self.allowed_role_ids = allowed_role_ids
+
+    @classmethod
+    def from_row(cls, row):
+        allowed_ids_str = row['allowed_role_ids'] or ""
+        allowed_role_ids = frozenset(int(role_id) for role_id in allowed_ids_str.split(',') if role_id)
+        return cls(row['guild_id'], row['audit_log_channel_id'], allowed_role_ids)
+
+    def allows(self, member) -> bool:
+        """Administrators always pass; everyone else needs one of the configured roles."""
+        if member.guild_permissions.administrator:
+            return True
+        return any(role.id in self.allowed_role_ids for role in member.roles)
+
+
+class ConfigService:
+    """Owns the bot's single database connection and caches every guild's config.
+
+    All configs are loaded once at startup, so lookups never touch the database.
+    `set_guild_config` is the only writer and keeps the cache in step with the table.
+    """
+
+    def __init__(self):
+        self.db = None
+        self._configs = {}
+
+    async def open(self, db_path):
+        self.db = await asqlite.connect(db_path)
+        await self.db.execute("PRAGMA journal_mode=WAL")
+        await self.db.execute("PRAGMA synchronous=NORMAL")
+        print("[CONFIG_SERVICE][OPEN] Shared database connection opened (WAL mode).")
+
+    async def close(self):
+        if self.db is not None:
+            await self.db.close()
+            self.db = None
+
+    async def load(self, owns_guild=None):
+        """Caches every guild's config, or with `owns_guild`, only the guilds it accepts."""
+        rows = await self.db.fetchall("SELECT guild_id, audit_log_channel_id, allowed_role_ids FROM guild_configs")
+        self._configs = {row['guild_id']: GuildConfig.from_row(row) for row in rows if owns_guild is None or owns_guild(row['guild_id'])}
+        print(f"[CONFIG_SERVICE][LOAD] Cached configuration for {len(self._configs)} guild(s).")
+
+    def get(self, guild_id):
+        """Returns the guild's GuildConfig, or None if /setup hasn't been run there."""
+        return self._configs.get(guild_id)
+
+    async def check_interaction(self, interaction) -> bool:
+        """The shared `interaction_check` of the move cogs: /setup must have run and the user must be allowed.
+
+        On failure the user is told why, as the interaction's response.
+        """
+        config = self.get(interaction.guild.id)
+        if not config:
+            await interaction.response.send_message("❌ MoveIt has not been configured. An admin must run `/setup` first.", ephemeral=True)
+            return False
+        if not config.allows(interaction.user):
+            await interaction.response.send_message("❌ You do not have the required role or permissions to use this command.", ephemeral=True)
+            return False
+        return True
+
+    async def set_guild_config(self, guild_id, audit_log_channel_id, role_ids_str):
+        await self.db.execute("INSERT OR REPLACE INTO guild_configs (guild_id, audit_log_channel_id, allowed_role_ids) VALUES (?, ?, ?)", (guild_id, audit_log_channel_id, role_ids_str))
+        await self.db.commit()
+        self._configs.pop(guild_id, None)
+        row = await self.db.fetchone("SELECT guild_id, audit_log_channel_id, allowed_role_ids FROM guild_configs WHERE guild_id = ?", (guild_id,))
+        if row:
+            self._configs[guild_id] = GuildConfig.from_row(row)
@@ -2,76 +2,169 @@
 import io
 import json
 import os
+import hashlib
+import datetime
+import threading
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
 
 SCOPES = ['https://www.googleapis.com/auth/drive']
 DB_FILENAME = 'settings.db'
+REMOTE_FIELDS = 'files(id, name, md5Checksum, modifiedTime, size)'
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+# The Drive client isn't thread-safe and these functions run in executor threads,
+# so every use of the shared service goes through this lock.
+drive_lock = threading.RLock()
+_services = {}
 
 def get_drive_service(credentials_json_string):
-    print("[GDRIVE_HANDLER][GET_SERVICE] Authenticating with Google...")
-    try:
-        creds_info = json.loads(credentials_json_string)
-        creds = service_account.Credentials.from_service_account_info(creds_info, scopes=SCOPES)
-        service = build('drive', 'v3', credentials=creds)
-        print("[GDRIVE_HANDLER][GET_SERVICE] Authentication successful.")
-        return service
-    except Exception as e:
-        print(f"[GDRIVE_HANDLER][GET_SERVICE] ❌ FAILED to authenticate with Google: {e}")
-        return None
+    """Builds the Drive service once per set of credentials and reuses it afterwards."""
+    with drive_lock:
+        service = _services.get(credentials_json_string)
+        if service is not None:
+            return service
+        print("[GDRIVE_HANDLER][GET_SERVICE] Authenticating with Google...")
+        try:
+            creds_info = json.loads(credentials_json_string)
+            creds = service_account.Credentials.from_service_account_info(creds_info, scopes=SCOPES)
+            service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+            print("[GDRIVE_HANDLER][GET_SERVICE] Authentication successful.")
+            _services[credentials_json_string] = service
+            return service
+        except Exception as e:
+            print(f"[GDRIVE_HANDLER][GET_SERVICE] ❌ FAILED to authenticate with Google: {e}")
+            return None
+
+def _find_remote(service, folder_id):
+    query = f"'{folder_id}' in parents and name = '{DB_FILENAME}'"
+    response = service.files().list(q=query, spaces='drive', fields=REMOTE_FIELDS).execute()
+    files = response.get('files', [])
+    return files[0] if files else None
+
+def _remote_mtime(remote):
+    return datetime.datetime.fromisoformat(remote['modifiedTime'].replace('Z', '+00:00')).timestamp()
+
+def _local_md5(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def local_mtime(local_db_path):
+    """When the local DB last changed, counting writes still sitting in its WAL."""
+    return max((os.stat(path).st_mtime for path in (local_db_path, local_db_path + '-wal') if os.path.exists(path)), default=None)
+
+def _rfc3339(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat().replace('+00:00', 'Z')
+
+def _is_current(remote, local_db_path):
+    """Whether the local DB already matches the remote copy.
+
+    A downloaded file gets the remote modifiedTime as its mtime, so an unchanged pair is
+    recognised from size and mtime alone; otherwise the MD5 checksums decide.
+    """
+    if not os.path.exists(local_db_path):
+        return False
+    stat = os.stat(local_db_path)
+    if 'size' in remote and int(remote['size']) != stat.st_size:
+        return False
+    if 'modifiedTime' in remote and abs(_remote_mtime(remote) - stat.st_mtime) < 1:
+        return True
+    return remote.get('md5Checksum') == _local_md5(local_db_path)
+
+def _execute_resumable(request):
+    """Sends a resumable upload chunk by chunk; a failed chunk is retried by the client instead of restarting the file."""
+    response = None
+    while response is None:
+        status, response = request.next_chunk(num_retries=3)
+        if status:
+            print(f"[GDRIVE_HANDLER][UPLOAD] Upload progress: {int(status.progress() * 100)}%.")
+    return response
 
 def sync_with_gdrive(credentials, folder_id, local_db_path):
+    """Blocking; run it in an executor. The DB must not be open while this runs.
+
+    The remote copy is only downloaded when there is no local DB or the remote one is
+    newer (uploads are stamped with the time of the state they contain). Returns True
+    when the local DB is ahead of Drive and should be backed up once it is open.
+    """
     print("[GDRIVE_HANDLER][SYNC] Starting GDrive sync...")
     service = get_drive_service(credentials)
     if not service:
         print("[GDRIVE_HANDLER][SYNC] ❌ Cannot sync without a valid GDrive service.")
-        return
+        return False
 
-    print("[GDRIVE_HANDLER][SYNC] Checking for existing DB file on GDrive...")
-    query = f"'{folder_id}' in parents and name = '{DB_FILENAME}'"
-    response = service.files().list(q=query, spaces='drive', fields='files(id, name)').execute()
-    files = response.get('files', [])
+    with drive_lock:
+        print("[GDRIVE_HANDLER][SYNC] Checking for existing DB file on GDrive...")
+        remote = _find_remote(service, folder_id)
+        local_changed_at = local_mtime(local_db_path) if os.path.exists(local_db_path) else None
 
-    if not files:
-        print("[GDRIVE_HANDLER][SYNC] No remote DB found. If local DB exists, it will be uploaded.")
-        if os.path.exists(local_db_path):
-             upload_db(service, folder_id, local_db_path)
-    else:
-        print("[GDRIVE_HANDLER][SYNC] Remote DB found. Downloading...")
-        file_id = files[0].get('id')
-        request = service.files().get_media(fileId=file_id)
-        fh = io.FileIO(local_db_path, 'wb')
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-            if status:
-                print(f"[GDRIVE_HANDLER][SYNC] Download progress: {int(status.progress() * 100)}%.")
+        if remote is None:
+            print("[GDRIVE_HANDLER][SYNC] No remote DB found. The local DB (if any) will be backed up.")
+            return local_changed_at is not None
+
+        if local_changed_at is not None:
+            # Uploads carry the local DB's change time, so a remote copy that is not newer is ours (or older).
+            if 'modifiedTime' not in remote or _remote_mtime(remote) <= local_changed_at + 1:
+                ahead = 'modifiedTime' not in remote or local_changed_at > _remote_mtime(remote) + 1
+                print(f"[GDRIVE_HANDLER][SYNC] ✅ Local DB is {'newer than' if ahead else 'as new as'} the remote copy. Keeping it.")
+                return ahead
+            if _is_current(remote, local_db_path):
+                print("[GDRIVE_HANDLER][SYNC] ✅ Local DB matches the remote copy. Skipping download.")
+                return False
+
+        print("[GDRIVE_HANDLER][SYNC] Remote DB is newer (or there is no local DB). Downloading...")
+        request = service.files().get_media(fileId=remote['id'])
+        # Download next to the DB and swap it in at the end, so a failed download leaves the old file intact.
+        partial_path = local_db_path + '.download'
+        with io.FileIO(partial_path, 'wb') as fh:
+            downloader = MediaIoBaseDownload(fh, request)
+            done = False
+            while not done:
+                status, done = downloader.next_chunk()
+                if status:
+                    print(f"[GDRIVE_HANDLER][SYNC] Download progress: {int(status.progress() * 100)}%.")
+        # WAL files left over from the old DB would be replayed onto the new one.
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(local_db_path + suffix):
+                os.remove(local_db_path + suffix)
+        os.replace(partial_path, local_db_path)
+        if 'modifiedTime' in remote:
+            mtime = _remote_mtime(remote)
+            os.utime(local_db_path, (mtime, mtime))
         print("[GDRIVE_HANDLER][SYNC] ✅ Download complete.")
+        return False
 
-def upload_db(service, folder_id, local_db_path):
+def upload_db(service, folder_id, local_db_path, changed_at=None):
+    """Uploads the file. `changed_at` (a timestamp) becomes the remote modifiedTime, so the
+    next sync can tell whether the remote copy is newer than the local DB."""
     print("[GDRIVE_HANDLER][UPLOAD] Starting DB upload...")
     if not os.path.exists(local_db_path):
         print("[GDRIVE_HANDLER][UPLOAD] ❌ Local DB file does not exist. Cannot upload.")
-        return
+        return False
 
-    query = f"'{folder_id}' in parents and name = '{DB_FILENAME}'"
-    response = service.files().list(q=query, spaces='drive', fields='files(id, name)').execute()
-    files = response.get('files', [])
-    
-    media = MediaFileUpload(local_db_path, mimetype='application/x-sqlite3')
-
-    try:
-        if not files:
-            print("[GDRIVE_HANDLER][UPLOAD] Remote file not found. Creating new file...")
-            file_metadata = {'name': DB_FILENAME, 'parents': [folder_id]}
-            service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-            print("[GDRIVE_HANDLER][UPLOAD] ✅ New file created and uploaded successfully.")
-        else:
-            file_id = files[0].get('id')
-            print(f"[GDRIVE_HANDLER][UPLOAD] Remote file found. Updating file ID {file_id}...")
-            service.files().update(fileId=file_id, media_body=media).execute()
-            print("[GDRIVE_HANDLER][UPLOAD] ✅ File updated successfully.")
-    except Exception as e:
-        print(f"[GDRIVE_HANDLER][UPLOAD] ❌ FAILED to upload DB: {e}")
\ No newline at end of file
+    with drive_lock:
+        remote = _find_remote(service, folder_id)
+        media = MediaFileUpload(local_db_path, mimetype='application/x-sqlite3', chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+
+        try:
+            if remote is None:
+                print("[GDRIVE_HANDLER][UPLOAD] Remote file not found. Creating new file...")
+                file_metadata = {'name': DB_FILENAME, 'parents': [folder_id]}
+                if changed_at is not None:
+                    file_metadata['modifiedTime'] = _rfc3339(changed_at)
+                _execute_resumable(service.files().create(body=file_metadata, media_body=media, fields='id'))
+                print("[GDRIVE_HANDLER][UPLOAD] ✅ New file created and uploaded successfully.")
+            else:
+                file_id = remote['id']
+                print(f"[GDRIVE_HANDLER][UPLOAD] Remote file found. Updating file ID {file_id}...")
+                body = {'modifiedTime': _rfc3339(changed_at)} if changed_at is not None else None
+                _execute_resumable(service.files().update(fileId=file_id, body=body, media_body=media))
+                print("[GDRIVE_HANDLER][UPLOAD] ✅ File updated successfully.")
+            return True
+        except Exception as e:
+            print(f"[GDRIVE_HANDLER][UPLOAD] ❌ FAILED to upload DB: {e}")
+            return False
\ No newline at end of file
@@ -0,0 +1,77 @@
+# health_server.py
+
+import os
+import math
+import time
+import asyncio
+from aiohttp import web
+import metrics
+
+PORT = int(os.getenv('PORT', '8080'))
+# How often the event loop's responsiveness is sampled.
+LAG_SAMPLE_INTERVAL = 1.0
+
+
+class HealthServer:
+    """The keep-alive web server, running on the bot's own event loop.
+
+    `/` answers uptime pings, `/health` reports the gateway latency, event loop lag and
+    job counts (503 until the bot is connected), and `/metrics` serves the Prometheus
+    metrics. Handlers read bot state directly, so nothing crosses threads. Each shard
+    process serves its own, covering only the shards it runs.
+    """
+
+    def __init__(self, bot, port=PORT):
+        self.bot = bot
+        self.port = port
+        self.loop_lag = 0.0
+        self._started_at = time.monotonic()
+        self._runner = None
+        self._lag_task = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/', self.home)
+        app.router.add_get('/health', self.health)
+        app.router.add_get('/metrics', self.metrics_endpoint)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '0.0.0.0', self.port).start()
+        self._lag_task = asyncio.create_task(self._sample_loop_lag())
+        print(f"[HEALTH_SERVER][START] Serving on port {self.port}.")
+
+    async def close(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def home(self, request):
+        return web.Response(text="MoveIt is alive!")
+
+    async def health(self, request):
+        latency = self.bot.latency
+        ready = self.bot.is_ready() and math.isfinite(latency)
+        body = {
+            'status': 'ok' if ready else 'starting',
+            'gateway_latency_seconds': latency if math.isfinite(latency) else None,
+            'shards': {str(shard_id): shard_latency if math.isfinite(shard_latency) else None for shard_id, shard_latency in self.bot.latencies},
+            'event_loop_lag_seconds': self.loop_lag,
+            'jobs_active': self.bot.scheduler.running_count,
+            'jobs_queued': self.bot.scheduler.queued_count,
+            'uptime_seconds': time.monotonic() - self._started_at,
+        }
+        return web.json_response(body, status=200 if ready else 503)
+
+    async def metrics_endpoint(self, request):
+        return web.Response(body=metrics.render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    async def _sample_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LAG_SAMPLE_INTERVAL
+            await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+            # However late the sleep woke up is how long other callbacks held the loop.
+            self.loop_lag = max(0.0, loop.time() - expected)
@@ -0,0 +1,225 @@
+# jobs.py
+
+import os
+import sys
+import json
+import itertools
+import asyncio
+import discord
+
+# How many moved messages may pile up before the job's progress is written to the DB.
+CHECKPOINT_INTERVAL = int(os.getenv('CHECKPOINT_INTERVAL', '50'))
+MAX_CONCURRENT_JOBS = int(os.getenv('MAX_CONCURRENT_JOBS', '4'))
+MAX_JOBS_PER_GUILD = int(os.getenv('MAX_JOBS_PER_GUILD', '2'))
+
+# Jobs run smallest first. When the size isn't known up front, fall back on what the kind usually is.
+DEFAULT_JOB_SIZES = {'split': 50, 'queue': 100, 'movebyuser': 500, 'merge': 10_000}
+
+
+class JobCancelled(Exception):
+    """Raised inside a running transfer once someone cancels its job."""
+
+
+class MoveJob:
+    """A merge, split or queue move, as recorded in the `jobs` table.
+
+    `spec` holds everything needed to restart the move without the original
+    interaction. `last_message_id` is the newest source message that has been
+    both reposted and deleted; a resumed job picks up right after it.
+    """
+
+    def __init__(self, job_id, kind, guild_id, user_id, spec, last_message_id=None, moved_count=0):
+        self.id = job_id
+        self.kind = kind
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.spec = spec
+        self.last_message_id = last_message_id
+        self.moved_count = moved_count
+        self.status = 'running'
+        self.cancel_requested = False
+        self._unpaused = asyncio.Event()
+        self._unpaused.set()
+
+    @property
+    def paused(self):
+        return not self._unpaused.is_set()
+
+    def pause(self):
+        self._unpaused.clear()
+
+    def unpause(self):
+        self._unpaused.set()
+
+    def cancel(self):
+        self.cancel_requested = True
+        # A paused job has to wake up to notice it was cancelled.
+        self._unpaused.set()
+
+    async def wait_unpaused(self):
+        await self._unpaused.wait()
+
+    async def gate(self):
+        """Called between messages: blocks while paused, raises once cancelled."""
+        await self._unpaused.wait()
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    @property
+    def resume_after(self):
+        """A snowflake to pass as `history(after=...)`, or None if nothing was committed yet."""
+        return discord.Object(id=self.last_message_id) if self.last_message_id else None
+
+
+class JobStore:
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def create(self, kind, guild_id, user_id, spec) -> MoveJob:
+        conn = self.bot.config.db
+        cursor = await conn.execute(
+            "INSERT INTO jobs (kind, guild_id, user_id, spec, status, moved_count, updated_at) VALUES (?, ?, ?, ?, 'running', 0, CURRENT_TIMESTAMP)",
+            (kind, guild_id, user_id, json.dumps(spec))
+        )
+        job_id = cursor.get_cursor().lastrowid
+        await conn.commit()
+        self.bot.backups.request()
+        print(f"[JOBS][CREATE] Job {job_id} ({kind}) recorded for guild {guild_id}.")
+        return MoveJob(job_id, kind, guild_id, user_id, spec)
+
+    async def checkpoint(self, job, last_message_id, moved_count):
+        job.last_message_id = last_message_id
+        job.moved_count = moved_count
+        conn = self.bot.config.db
+        await conn.execute(
+            "UPDATE jobs SET last_message_id = ?, moved_count = ?, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+            (last_message_id, moved_count, job.id)
+        )
+        await conn.commit()
+        self.bot.backups.request()
+
+    async def finish(self, job, status='done'):
+        job.status = status
+        conn = self.bot.config.db
+        await conn.execute("UPDATE jobs SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?", (status, job.id))
+        await conn.commit()
+        self.bot.backups.request()
+        print(f"[JOBS][FINISH] Job {job.id} ({job.kind}) finished with status '{status}'.")
+
+    async def unfinished(self):
+        rows = await self.bot.config.db.fetchall("SELECT * FROM jobs WHERE status = 'running' ORDER BY job_id")
+        return [
+            MoveJob(row['job_id'], row['kind'], row['guild_id'], row['user_id'], json.loads(row['spec']), row['last_message_id'], row['moved_count'])
+            for row in rows
+        ]
+
+
+class _Entry:
+    def __init__(self, job, run, size, seq):
+        self.job = job
+        self.run = run
+        self.size = size
+        self.seq = seq
+        self.task = None
+
+    def __lt__(self, other):
+        return (self.size, self.seq) < (other.size, other.seq)
+
+
+class JobScheduler:
+    """Runs every move job, so concurrent commands can't stampede the rate limits.
+
+    At most MAX_CONCURRENT_JOBS run at once, and at most MAX_JOBS_PER_GUILD of them
+    for any single guild. When a slot frees up, the guild with the fewest running
+    jobs goes first, and within that the smallest job (a /split before a /merge).
+    """
+
+    def __init__(self, bot, max_jobs=MAX_CONCURRENT_JOBS, max_per_guild=MAX_JOBS_PER_GUILD):
+        self.bot = bot
+        self.max_jobs = max_jobs
+        self.max_per_guild = max_per_guild
+        self._queued = []
+        self._running = {}
+        self._seq = itertools.count()
+
+    def submit(self, job, run, size=None) -> int:
+        """Queues `run` (a coroutine function) for the job. Returns how many jobs are waiting ahead of it."""
+        entry = _Entry(job, run, size if size is not None else DEFAULT_JOB_SIZES.get(job.kind, 1000), next(self._seq))
+        self._queued.append(entry)
+        self._pump()
+        if job.id in self._running:
+            return 0
+        return sum(1 for other in self._queued if other < entry)
+
+    def get(self, job_id):
+        if job_id in self._running:
+            return self._running[job_id].job
+        for entry in self._queued:
+            if entry.job.id == job_id:
+                return entry.job
+        return None
+
+    def jobs(self, guild_id=None):
+        """Running jobs first, then queued ones in the order they would start."""
+        entries = list(self._running.values()) + sorted(self._queued)
+        return [(entry.job, entry.job.id in self._running) for entry in entries if guild_id is None or entry.job.guild_id == guild_id]
+
+    @property
+    def running_count(self):
+        return len(self._running)
+
+    @property
+    def queued_count(self):
+        return len(self._queued)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return False
+        job.cancel()
+        if job_id not in self._running:
+            # Never started: drop it from the queue straight away.
+            self._queued = [entry for entry in self._queued if entry.job.id != job_id]
+            asyncio.create_task(self.bot.job_store.finish(job, 'cancelled'))
+        return True
+
+    def unpause(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return False
+        job.unpause()
+        self._pump()
+        return True
+
+    def _pump(self):
+        while self._queued and len(self._running) < self.max_jobs:
+            running_per_guild = {}
+            for entry in self._running.values():
+                running_per_guild[entry.job.guild_id] = running_per_guild.get(entry.job.guild_id, 0) + 1
+            candidates = [
+                entry for entry in self._queued
+                if not entry.job.paused and running_per_guild.get(entry.job.guild_id, 0) < self.max_per_guild
+            ]
+            if not candidates:
+                return
+            entry = min(candidates, key=lambda e: (running_per_guild.get(e.job.guild_id, 0), e.size, e.seq))
+            self._queued.remove(entry)
+            self._running[entry.job.id] = entry
+            entry.task = asyncio.create_task(self._run(entry))
+
+    async def _run(self, entry):
+        job = entry.job
+        print(f"[JOBS][SCHEDULER] Starting job {job.id} ({job.kind}) for guild {job.guild_id}.")
+        try:
+            await entry.run()
+        except JobCancelled:
+            print(f"[JOBS][SCHEDULER] Job {job.id} ({job.kind}) was cancelled.")
+        except Exception as e:
+            print(f"[JOBS][SCHEDULER] ❌ Job {job.id} ({job.kind}) crashed: {e}", file=sys.stderr)
+            if job.status == 'running':
+                await self.bot.job_store.finish(job, 'failed')
+        finally:
+            if job.cancel_requested and job.status == 'running':
+                await self.bot.job_store.finish(job, 'cancelled')
+            del self._running[job.id]
+            self._pump()
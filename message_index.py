@@ -0,0 +1,146 @@
+# message_index.py
+
+import os
+import asyncio
+import datetime
+import discord
+
+MESSAGE_INDEX = os.getenv('MESSAGE_INDEX', 'false').lower() == 'true'
+MESSAGE_INDEX_RETENTION_DAYS = int(os.getenv('MESSAGE_INDEX_RETENTION_DAYS', '14'))
+# How long new index rows may sit in memory before they are written to the DB.
+FLUSH_INTERVAL = 2.0
+# How often rows past the retention window are pruned.
+PRUNE_INTERVAL = 3600.0
+
+
+class MessageIndex:
+    """An optional index of recent message metadata, fed from gateway events.
+
+    Only metadata is stored: id, channel, author and whether the message has
+    attachments or embeds (the timestamp is part of the snowflake). Gateway events can
+    be missed while a shard is disconnected, so the index only answers for messages
+    sent since the current session of the shard carrying the channel's guild became
+    ready, and not at all while that shard is down. Everything else returns None and
+    callers fall back to the REST history endpoint.
+    """
+
+    def __init__(self, bot, enabled=MESSAGE_INDEX, retention_days=MESSAGE_INDEX_RETENTION_DAYS):
+        self.bot = bot
+        self.enabled = enabled
+        self.retention = datetime.timedelta(days=retention_days)
+        self._pending = []
+        # Per shard: the first snowflake its current session has seen every event for.
+        self._covered_from = {}
+        # Shards that are disconnected; until they resume (or start a new session) they may miss events.
+        self._interrupted = set()
+        self._flush_task = None
+
+    async def load(self):
+        if not self.enabled:
+            return
+        self.bot.add_listener(self.on_shard_ready)
+        self.bot.add_listener(self.on_shard_disconnect)
+        self.bot.add_listener(self.on_shard_resumed)
+        self.bot.add_listener(self.on_message)
+        self.bot.add_listener(self.on_raw_message_delete)
+        self.bot.add_listener(self.on_raw_bulk_message_delete)
+        await self.prune()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        print(f"[MESSAGE_INDEX][LOAD] Message index enabled ({self.retention.days} day retention).")
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    # --- Gateway events ---
+
+    async def on_shard_ready(self, shard_id):
+        # A fresh session (not a resume) may have missed events, so the shard's coverage restarts now.
+        self._covered_from[shard_id] = discord.utils.time_snowflake(discord.utils.utcnow(), high=False)
+        self._interrupted.discard(shard_id)
+
+    async def on_shard_disconnect(self, shard_id):
+        self._interrupted.add(shard_id)
+
+    async def on_shard_resumed(self, shard_id):
+        # A resumed session replays what it missed, so its coverage still holds.
+        self._interrupted.discard(shard_id)
+
+    async def on_message(self, message):
+        if message.guild is None:
+            return
+        self._pending.append(("INSERT OR REPLACE INTO message_index (message_id, channel_id, guild_id, author_id, has_attachments, has_embeds) VALUES (?, ?, ?, ?, ?, ?)", (message.id, message.channel.id, message.guild.id, message.author.id, bool(message.attachments), bool(message.embeds))))
+
+    async def on_raw_message_delete(self, payload):
+        self._pending.append(("DELETE FROM message_index WHERE message_id = ?", (payload.message_id,)))
+
+    async def on_raw_bulk_message_delete(self, payload):
+        for message_id in payload.message_ids:
+            self._pending.append(("DELETE FROM message_index WHERE message_id = ?", (message_id,)))
+
+    # --- Queries ---
+
+    def covers(self, channel_id, after_id):
+        """Whether every message in the channel with an ID above `after_id` is in the index."""
+        if not self.enabled or after_id is None:
+            return False
+        channel = self.bot.get_channel(channel_id)
+        if channel is None or getattr(channel, 'guild', None) is None:
+            return False
+        shard_id = (channel.guild.id >> 22) % (self.bot.shard_count or 1)
+        covered_from = self._covered_from.get(shard_id)
+        if covered_from is None or shard_id in self._interrupted:
+            return False
+        retained_from = discord.utils.time_snowflake(discord.utils.utcnow() - self.retention, high=False)
+        return after_id >= max(covered_from, retained_from)
+
+    async def author_messages(self, channel_id, author_id, after_id):
+        """IDs of the author's messages after `after_id`, oldest first, or None if the index can't answer."""
+        if not self.covers(channel_id, after_id):
+            return None
+        await self.flush()
+        rows = await self.bot.config.db.fetchall("SELECT message_id FROM message_index WHERE channel_id = ? AND author_id = ? AND message_id > ? ORDER BY message_id", (channel_id, author_id, after_id))
+        return [row['message_id'] for row in rows]
+
+    async def count_range(self, channel_id, start_id, end_id):
+        """How many messages lie in [start_id, end_id], or None if the index can't answer."""
+        if not self.covers(channel_id, start_id - 1):
+            return None
+        await self.flush()
+        row = await self.bot.config.db.fetchone("SELECT COUNT(*) AS n FROM message_index WHERE channel_id = ? AND message_id BETWEEN ? AND ?", (channel_id, start_id, end_id))
+        return row['n']
+
+    # --- Persistence ---
+
+    async def flush(self):
+        if not self._pending or self.bot.config.db is None:
+            return
+        pending, self._pending = self._pending, []
+        try:
+            for query, params in pending:
+                await self.bot.config.db.execute(query, params)
+            await self.bot.config.db.commit()
+        except Exception:
+            # Keep the changes (in order) for the next attempt.
+            self._pending = pending + self._pending
+            raise
+
+    async def prune(self):
+        cutoff = discord.utils.time_snowflake(discord.utils.utcnow() - self.retention, high=False)
+        await self.bot.config.db.execute("DELETE FROM message_index WHERE message_id < ?", (cutoff,))
+        await self.bot.config.db.commit()
+
+    async def _flush_loop(self):
+        since_prune = 0.0
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            since_prune += FLUSH_INTERVAL
+            try:
+                await self.flush()
+                if since_prune >= PRUNE_INTERVAL:
+                    since_prune = 0.0
+                    await self.prune()
+            except Exception as e:
+                print(f"[MESSAGE_INDEX][FLUSH] ❌ Failed to write index changes: {e}")
@@ -0,0 +1,98 @@
+# message_source.py
+
+import heapq
+import asyncio
+import datetime
+import discord
+
+HISTORY_PAGE_SIZE = 100
+# How many channels are read at the same time when resolving a queue.
+MAX_CONCURRENT_CHANNELS = 4
+
+
+def stream_range(channel, start_id, end_id):
+    """Streams the messages with start_id <= id <= end_id, oldest first, one history page at a time."""
+    return channel.history(limit=None, after=discord.Object(id=start_id - 1), before=discord.Object(id=end_id + 1), oldest_first=True)
+
+
+def snowflake_since(seconds):
+    """The lowest snowflake a message sent in the last `seconds` seconds can have."""
+    since = discord.utils.utcnow() - datetime.timedelta(seconds=seconds)
+    return discord.utils.time_snowflake(since, high=False)
+
+
+async def stream_by_author(channel, author_id, after_id=None):
+    """Streams one author's messages, oldest first, from after `after_id` to now.
+
+    The lower bound is passed to the history request itself, so only the pages inside
+    the window are read. Filtering happens as the pages arrive.
+    """
+    after = discord.Object(id=after_id) if after_id else None
+    async for message in channel.history(limit=None, after=after, oldest_first=True):
+        if message.author.id == author_id:
+            yield message
+
+
+async def stream_ids(bot, channel_id, message_ids):
+    """Streams known message IDs of one channel as messages, oldest first.
+
+    IDs are resolved a page's worth at a time, so only that many messages are held
+    before the consumer takes them. Messages that no longer exist are skipped.
+    """
+    message_ids = sorted(message_ids)
+    for i in range(0, len(message_ids), HISTORY_PAGE_SIZE):
+        for message in await _resolve_channel(bot, channel_id, message_ids[i:i + HISTORY_PAGE_SIZE]):
+            yield message
+
+
+async def _resolve_channel(bot, channel_id, message_ids):
+    """Fetches the given messages of one channel with as few history pages as possible.
+
+    Each page starts right at the oldest ID still wanted and is bounded above by the
+    newest one, so IDs that sit close together come back in a single request.
+    Messages that no longer exist are skipped.
+    """
+    try:
+        channel = bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+    except (discord.NotFound, discord.Forbidden):
+        return []
+
+    wanted = sorted(set(message_ids))
+    before = discord.Object(id=wanted[-1] + 1)
+    found = []
+    i = 0
+    try:
+        while i < len(wanted):
+            after = discord.Object(id=wanted[i] - 1)
+            page = [message async for message in channel.history(limit=HISTORY_PAGE_SIZE, after=after, before=before, oldest_first=True)]
+            if not page:
+                break
+            by_id = {message.id: message for message in page}
+            last_id = page[-1].id
+            while i < len(wanted) and wanted[i] <= last_id:
+                if wanted[i] in by_id:
+                    found.append(by_id[wanted[i]])
+                i += 1
+    except (discord.NotFound, discord.Forbidden):
+        pass
+    return found
+
+
+async def resolve_queued(bot, items):
+    """Resolves (channel_id, message_id) pairs into messages, oldest first.
+
+    Items are grouped per channel and the channels are read concurrently. Each
+    channel's result is already in ID order, so they are merged rather than sorted.
+    """
+    by_channel = {}
+    for channel_id, message_id in items:
+        by_channel.setdefault(channel_id, []).append(message_id)
+
+    limiter = asyncio.Semaphore(MAX_CONCURRENT_CHANNELS)
+
+    async def resolve(channel_id, message_ids):
+        async with limiter:
+            return await _resolve_channel(bot, channel_id, message_ids)
+
+    per_channel = await asyncio.gather(*(resolve(channel_id, message_ids) for channel_id, message_ids in by_channel.items()))
+    return list(heapq.merge(*per_channel, key=lambda message: message.id))
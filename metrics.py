@@ -0,0 +1,112 @@
+# metrics.py
+
+import re
+import math
+
+# A tiny Prometheus text-format registry. Metrics are updated and rendered on the
+# event loop; rendering only ever reads copies.
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.copy().items():
+            lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """A gauge whose value is read from a callback at scrape time."""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.callback = None
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        if self.callback is not None:
+            try:
+                value = float(self.callback())
+            except Exception:
+                value = math.nan
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = sorted(buckets)
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value):
+        self._sum += value
+        self._count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self._counts[i] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        counts = list(self._counts)
+        for bound, count in zip(self.buckets, counts):
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {count}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self._count}')
+        lines.append(f"{self.name}_sum {self._sum}")
+        lines.append(f"{self.name}_count {self._count}")
+        return lines
+
+
+messages_moved = Counter("moveit_messages_moved_total", "Messages reposted into a destination.")
+messages_deleted = Counter("moveit_messages_deleted_total", "Moved originals deleted from their source channel.")
+messages_skipped = Counter("moveit_messages_skipped_total", "Unsendable messages (e.g. sticker-only) that were skipped.")
+attachment_bytes = Counter("moveit_attachment_bytes_total", "Attachment bytes downloaded for re-upload.")
+rate_limited = Counter("moveit_rate_limited_total", "429 responses received, per route.")
+retry_after_seconds = Counter("moveit_retry_after_seconds_total", "Total Retry-After time imposed by 429 responses, per route.")
+webhook_send_seconds = Histogram("moveit_webhook_send_seconds", "Latency of webhook sends.", [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30])
+jobs_active = Gauge("moveit_jobs_active", "Move jobs currently running.")
+jobs_queued = Gauge("moveit_jobs_queued", "Move jobs waiting for a free slot.")
+gateway_latency_seconds = Gauge("moveit_gateway_latency_seconds", "Discord gateway heartbeat latency.")
+event_loop_lag_seconds = Gauge("moveit_event_loop_lag_seconds", "How late the last event loop lag probe woke up.")
+
+REGISTRY = [
+    messages_moved, messages_deleted, messages_skipped, attachment_bytes,
+    rate_limited, retry_after_seconds, webhook_send_seconds,
+    jobs_active, jobs_queued, gateway_latency_seconds, event_loop_lag_seconds,
+]
+
+_SNOWFLAKE = re.compile(r'/\d{15,}')
+_WEBHOOK_TOKEN = re.compile(r'(/webhooks/:id)/[^/]+')
+
+
+def route_label(method, path):
+    """Collapses IDs and webhook tokens so every request to the same endpoint shares one label."""
+    path = _SNOWFLAKE.sub('/:id', path)
+    path = _WEBHOOK_TOKEN.sub(r'\1/:token', path)
+    return f"{method} {path}"
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -5,12 +5,23 @@ import sys
 import discord
 import asyncio
 import logging
-import asqlite
+import time
+import json
+import hashlib
 from discord.ext import commands
 from dotenv import load_dotenv
-from threading import Thread
-from flask import Flask
 import gdrive_handler
+import metrics
+from pacing import TransferPacer
+from jobs import JobStore, JobScheduler
+from config_service import ConfigService
+from webhook_registry import WebhookRegistry
+from attachments import AttachmentTransfer
+from move_queue_store import MoveQueueStore
+from message_index import MessageIndex
+from backup_service import BackupService
+from audit_log import AuditLogSink
+from health_server import HealthServer
 
 print("[MOVEIT_PY][STARTUP] Script execution started.")
 
@@ -26,6 +37,29 @@ GDRIVE_FOLDER_ID = os.getenv('GDRIVE_FOLDER_ID')
 if not all([TOKEN, DB_PATH, LOG_PATH, GDRIVE_CREDENTIALS, GDRIVE_FOLDER_ID]):
     print("CRITICAL ERROR: One or more environment variables are missing.", file=sys.stderr)
     sys.exit("Exiting due to missing environment variables.")
+
+def _parse_shard_ids(value):
+    """Accepts "0,1,2" or a range like "0-3"."""
+    shard_ids = []
+    for part in value.split(','):
+        part = part.strip()
+        if '-' in part:
+            first, last = part.split('-', 1)
+            shard_ids.extend(range(int(first), int(last) + 1))
+        elif part:
+            shard_ids.append(int(part))
+    return sorted(set(shard_ids))
+
+# Unset, discord.py picks the shard count and this process runs every shard.
+# With SHARD_IDS as well, this process runs only those shards of SHARD_COUNT,
+# so shard groups can run as separate processes sharing the same database.
+SHARD_COUNT = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None
+try:
+    SHARD_IDS = _parse_shard_ids(os.getenv('SHARD_IDS')) if os.getenv('SHARD_IDS') else None
+except ValueError:
+    sys.exit("Exiting: SHARD_IDS must look like \"0,1,2\" or \"0-3\".")
+if SHARD_IDS is not None and (SHARD_COUNT is None or any(shard_id >= SHARD_COUNT for shard_id in SHARD_IDS)):
+    sys.exit("Exiting: SHARD_IDS needs SHARD_COUNT, and every shard ID must be below it.")
 print("[MOVEIT_PY][STARTUP-STEP 1] Environment variables loaded successfully.")
 
 # --- Logger Setup ---
@@ -39,12 +73,22 @@ logger.addHandler(handler)
 print("[MOVEIT_PY][STARTUP-STEP 2] File logger initialized.")
 
 # --- Database Initialization Function ---
-async def db_init():
+async def db_init(connection):
     print("[MOVEIT_PY][DB_INIT] Initializing local database...")
-    async with asqlite.connect(DB_PATH) as connection:
-        await connection.execute("CREATE TABLE IF NOT EXISTS guild_configs (guild_id INTEGER PRIMARY KEY, audit_log_channel_id INTEGER, allowed_role_ids TEXT)")
-        await connection.execute("CREATE TABLE IF NOT EXISTS prefs (guild_id INTEGER PRIMARY KEY, notify_dm TEXT, embed_message TEXT, move_message TEXT, strip_ping TEXT, delete_original TEXT)")
-        await connection.commit()
+    await connection.execute("CREATE TABLE IF NOT EXISTS guild_configs (guild_id INTEGER PRIMARY KEY, audit_log_channel_id INTEGER, allowed_role_ids TEXT)")
+    await connection.execute("CREATE TABLE IF NOT EXISTS prefs (guild_id INTEGER PRIMARY KEY, notify_dm TEXT, embed_message TEXT, move_message TEXT, strip_ping TEXT, delete_original TEXT)")
+    await connection.execute("CREATE TABLE IF NOT EXISTS jobs (job_id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, guild_id INTEGER, user_id INTEGER, spec TEXT, status TEXT, last_message_id INTEGER, moved_count INTEGER, updated_at TEXT)")
+    await connection.execute("CREATE TABLE IF NOT EXISTS move_queue (guild_id INTEGER, user_id INTEGER, channel_id INTEGER, message_id INTEGER, position INTEGER, PRIMARY KEY (user_id, channel_id, message_id))")
+    # Queues from before sharding support were not keyed by guild.
+    columns = await connection.fetchall("PRAGMA table_info(move_queue)")
+    if not any(column['name'] == 'guild_id' for column in columns):
+        await connection.execute("ALTER TABLE move_queue ADD COLUMN guild_id INTEGER")
+    await connection.execute("CREATE TABLE IF NOT EXISTS webhooks (channel_id INTEGER PRIMARY KEY, webhook_id INTEGER, webhook_token TEXT)")
+    await connection.execute("CREATE TABLE IF NOT EXISTS message_index (message_id INTEGER PRIMARY KEY, channel_id INTEGER, guild_id INTEGER, author_id INTEGER, has_attachments INTEGER, has_embeds INTEGER)")
+    await connection.execute("CREATE TABLE IF NOT EXISTS bot_state (key TEXT PRIMARY KEY, value TEXT)")
+    await connection.execute("CREATE TABLE IF NOT EXISTS audit_outbox (id INTEGER PRIMARY KEY, guild_id INTEGER, embed TEXT)")
+    await connection.execute("CREATE INDEX IF NOT EXISTS message_index_channel_author ON message_index (channel_id, author_id, message_id)")
+    await connection.commit()
     print("[MOVEIT_PY][DB_INIT] Local database tables verified/created.")
 
 # --- Bot Definition ---
@@ -52,11 +96,46 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-class MoveItBot(commands.Bot):
+# Which cog knows how to pick up each kind of unfinished job.
+JOB_COGS = {'merge': 'MergeCog', 'split': 'SplitCog', 'queue': 'MoveQueueCog', 'movebyuser': 'MoveByUserCog'}
+
+class MoveItBot(commands.AutoShardedBot):
     def __init__(self):
-        super().__init__(command_prefix="!mi", intents=intents)
+        # The pacer watches every HTTP response, so it has to exist before the session is built.
+        self.pacer = TransferPacer()
+        super().__init__(command_prefix="!mi", intents=intents, http_trace=self.pacer.trace_config, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+        self.config = ConfigService()
+        self.job_store = JobStore(self)
+        self.scheduler = JobScheduler(self)
+        self.webhooks = WebhookRegistry(self)
+        self.attachments = AttachmentTransfer()
+        self.move_queue = MoveQueueStore(self)
+        self.message_index = MessageIndex(self)
+        self.audit = AuditLogSink(self)
+        self.health = HealthServer(self)
+        self.backups = BackupService(self, GDRIVE_CREDENTIALS, GDRIVE_FOLDER_ID, DB_PATH)
+        metrics.jobs_active.callback = lambda: self.scheduler.running_count
+        metrics.jobs_queued.callback = lambda: self.scheduler.queued_count
+        metrics.gateway_latency_seconds.callback = lambda: self.latency
+        metrics.event_loop_lag_seconds.callback = lambda: self.health.loop_lag
+        self._resume_task = None
+        self.startup_timings = {}
         print("[MOVEIT_PY][BOT_INIT] MoveItBot class initialized.")
 
+    @property
+    def is_primary(self):
+        """The process running shard 0 owns the work done once per deployment: Drive sync, backups, command sync."""
+        return self.shard_ids is None or 0 in self.shard_ids
+
+    def owns_guild(self, guild_id):
+        """Whether this process runs the shard that the guild's events arrive on."""
+        if SHARD_IDS is None:
+            return True
+        return (guild_id >> 22) % SHARD_COUNT in SHARD_IDS
+
+    async def on_shard_ready(self, shard_id):
+        print(f"[MOVEIT_PY][ON_SHARD_READY] Shard {shard_id} is ready.")
+
     async def on_ready(self):
         print("--------------------------------------------------")
         print(f"[MOVEIT_PY][ON_READY] Logged in as {self.user} (ID: {self.user.id}). Bot is fully operational.")
@@ -66,18 +145,57 @@ class MoveItBot(commands.Bot):
     # It is guaranteed to run before on_ready.
     async def setup_hook(self):
         print("[MOVEIT_PY][SETUP_HOOK] Starting async setup process...")
-        print("[MOVEIT_PY][SETUP_HOOK] Step 1: Google Drive Sync...")
-        gdrive_handler.sync_with_gdrive(GDRIVE_CREDENTIALS, GDRIVE_FOLDER_ID, DB_PATH)
-        print("[MOVEIT_PY][SETUP_HOOK] Step 1 complete.")
-        
-        print("[MOVEIT_PY][SETUP_HOOK] Step 2: Database Init...")
-        await db_init()
-        print("[MOVEIT_PY][SETUP_HOOK] Step 2 complete.")
-
-        print("[MOVEIT_PY][SETUP_HOOK] Step 3: Loading Cogs...")
+        started = time.perf_counter()
+        # Up first, so uptime pings are answered while the rest of startup runs.
+        await self.health.start()
+        # Cogs don't touch the database while loading, so they load while the DB is being prepared.
+        await asyncio.gather(self._timed("database", self._init_database()), self._timed("cogs", self._load_cogs()))
+        if self.is_primary:
+            await self._timed("command sync", self._sync_commands())
+
+        print("[MOVEIT_PY][SETUP_HOOK] Scheduling resume of unfinished jobs...")
+        self._resume_task = asyncio.create_task(self.resume_jobs())
+        self.startup_timings["total"] = time.perf_counter() - started
+        summary = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.startup_timings.items())
+        print(f"[MOVEIT_PY][SETUP_HOOK] Setup hook finished ({summary}).")
+
+    async def _timed(self, phase, coro):
+        started = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self.startup_timings[phase] = time.perf_counter() - started
+
+    async def _init_database(self):
+        local_ahead = False
+        if self.is_primary and SHARD_IDS is not None and os.path.exists(DB_PATH):
+            # Other shard processes may have the DB (and its WAL) open right now; swapping
+            # the file underneath them would lose or corrupt their writes.
+            print("[MOVEIT_PY][SETUP_HOOK] Sharded, with a local DB in place. Skipping the Drive restore.")
+            local_ahead = True
+        elif self.is_primary:
+            print("[MOVEIT_PY][SETUP_HOOK] Google Drive Sync...")
+            # Drive's client is blocking, so keep it off the event loop.
+            local_ahead = await self._timed("drive sync", asyncio.to_thread(gdrive_handler.sync_with_gdrive, GDRIVE_CREDENTIALS, GDRIVE_FOLDER_ID, DB_PATH))
+        else:
+            print(f"[MOVEIT_PY][SETUP_HOOK] Running shards {SHARD_IDS} of {SHARD_COUNT}. Using the primary process's database.")
+
+        print("[MOVEIT_PY][SETUP_HOOK] Database Init...")
+        await self.config.open(DB_PATH)
+        await db_init(self.config.db)
+        # These only read their own tables, so they can load side by side.
+        await asyncio.gather(self.config.load(self.owns_guild), self.webhooks.load(), self.move_queue.load(), self.message_index.load(), self.audit.load())
+        self.backups.start()
+        if local_ahead:
+            self.backups.request()
+        print("[MOVEIT_PY][SETUP_HOOK] Database ready.")
+
+    async def _load_cogs(self):
+        print("[MOVEIT_PY][SETUP_HOOK] Loading Cogs...")
         bot_dir = os.path.dirname(os.path.abspath(__file__))
         cogs_path = os.path.join(bot_dir, 'cogs')
-        for filename in os.listdir(cogs_path):
+        # Sorted so the command tree (and its hash) doesn't depend on directory order.
+        for filename in sorted(os.listdir(cogs_path)):
             if filename.endswith('.py'):
                 cog_name = f'cogs.{filename[:-3]}'
                 try:
@@ -85,33 +203,64 @@ class MoveItBot(commands.Bot):
                     print(f"[MOVEIT_PY][SETUP_HOOK] ✅ Successfully loaded Cog: {cog_name}")
                 except Exception as e:
                     print(f"[MOVEIT_PY][SETUP_HOOK] ❌ Failed to load cog {cog_name}: {e}", file=sys.stderr)
-        print("[MOVEIT_PY][SETUP_HOOK] Step 3 complete.")
 
-        print("[MOVEIT_PY][SETUP_HOOK] Step 4: Syncing application commands...")
+    async def _sync_commands(self):
+        """Syncs the global command tree, but only when it differs from the last one synced."""
+        payload = sorted((command.to_dict(self.tree) for command in self.tree.get_commands()), key=lambda command: (command['type'], command['name']))
+        tree_hash = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        row = await self.config.db.fetchone("SELECT value FROM bot_state WHERE key = 'command_tree_hash'")
+        if row and row['value'] == tree_hash:
+            print("[MOVEIT_PY][SETUP_HOOK] Command tree unchanged since the last sync. Skipping sync.")
+            return
+        print("[MOVEIT_PY][SETUP_HOOK] Syncing application commands...")
         try:
             await self.tree.sync()
             print("[MOVEIT_PY][SETUP_HOOK] ✅ Command tree successfully synced!")
         except Exception as e:
             print(f"[MOVEIT_PY][SETUP_HOOK] ❌ FAILED TO SYNC COMMANDS: {e}", file=sys.stderr)
-        print("[MOVEIT_PY][SETUP_HOOK] Step 4 complete.")
-        print("[MOVEIT_PY][SETUP_HOOK] Setup hook finished.")
-
-# --- Keep-Alive Server ---
-app = Flask('')
-@app.route('/')
-def home(): return "MoveIt is alive!"
-def run(): app.run(host='0.0.0.0', port=8080)
-def keep_alive():
-    print("[MOVEIT_PY][KEEP-ALIVE] Starting Flask server thread.")
-    Thread(target=run).start()
+            return
+        await self.config.db.execute("INSERT OR REPLACE INTO bot_state (key, value) VALUES ('command_tree_hash', ?)", (tree_hash,))
+        await self.config.db.commit()
+        # The Drive copy must carry the hash too, or a restore brings back the old one and we sync again.
+        self.backups.request()
+
+    async def close(self):
+        await super().close()
+        await self.health.close()
+        await self.attachments.close()
+        await self.move_queue.close()
+        await self.message_index.close()
+        await self.audit.close()
+        await self.backups.close()
+        await self.config.close()
+
+    async def resume_jobs(self):
+        # Channels and webhooks need a live connection, so wait for on_ready first.
+        await self.wait_until_ready()
+        # Other shard processes resume their own guilds' jobs.
+        jobs = [job for job in await self.job_store.unfinished() if self.owns_guild(job.guild_id)]
+        if not jobs:
+            return
+        print(f"[MOVEIT_PY][RESUME] Resuming {len(jobs)} unfinished job(s)...")
+        await asyncio.gather(*(self._resume_job(job) for job in jobs))
+
+    async def _resume_job(self, job):
+        cog = self.get_cog(JOB_COGS.get(job.kind, ''))
+        if cog is None:
+            print(f"[MOVEIT_PY][RESUME] ❌ No cog can resume job {job.id} ({job.kind}). Marking it failed.", file=sys.stderr)
+            await self.job_store.finish(job, 'failed')
+            return
+        try:
+            print(f"[MOVEIT_PY][RESUME] Resuming job {job.id} ({job.kind}) after message {job.last_message_id}.")
+            await cog.resume_job(job)
+        except Exception as e:
+            print(f"[MOVEIT_PY][RESUME] ❌ Job {job.id} ({job.kind}) could not be resumed: {e}", file=sys.stderr)
+            await self.job_store.finish(job, 'failed')
 
 # --- THIS IS THE CORRECTED MAIN EXECUTION BLOCK ---
 if __name__ == '__main__':
     print("[MOVEIT_PY][MAIN_BLOCK] Main execution block started.")
     
-    # Start the keep-alive server first
-    keep_alive()
-    
     # Create an instance of the bot
     bot = MoveItBot()
     
@@ -0,0 +1,129 @@
+# move_queue_store.py
+
+import os
+import asyncio
+
+MAX_QUEUE_SIZE = int(os.getenv('MAX_QUEUE_SIZE', '1000'))
+# How long queue changes may sit in memory before they are written to the DB.
+FLUSH_INTERVAL = 2.0
+
+
+class MoveQueueStore:
+    """Every user's "Add to Move Queue" selections, persisted across restarts.
+
+    Queues are kept per (guild_id, user_id), so a guild's queues live only in the
+    process that runs its shard. Each queue is a dict used as an insertion-ordered set
+    of (channel_id, message_id), so adds and duplicate checks are O(1). Changes are
+    applied in memory straight away and written to the `move_queue` table in the background.
+
+    Rows queued before queues were keyed by guild have no guild_id. They are adopted
+    by the first guild that asks for the user's queue and owns the message's channel.
+    """
+
+    def __init__(self, bot, max_size=MAX_QUEUE_SIZE):
+        self.bot = bot
+        self.max_size = max_size
+        self._queues = {}
+        self._legacy = {}
+        self._pending = []
+        self._next_position = 0
+        self._flush_task = None
+
+    async def load(self):
+        rows = await self.bot.config.db.fetchall("SELECT guild_id, user_id, channel_id, message_id FROM move_queue ORDER BY user_id, position")
+        loaded = 0
+        for row in rows:
+            item = (row['channel_id'], row['message_id'])
+            if row['guild_id'] is None:
+                self._legacy.setdefault(row['user_id'], {})[item] = None
+            elif self.bot.owns_guild(row['guild_id']):
+                self._queues.setdefault((row['guild_id'], row['user_id']), {})[item] = None
+                loaded += 1
+        row = await self.bot.config.db.fetchone("SELECT COALESCE(MAX(position), 0) AS max_position FROM move_queue")
+        self._next_position = row['max_position'] + 1
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        print(f"[MOVE_QUEUE_STORE][LOAD] Restored {loaded} queued message(s) for {len(self._queues)} queue(s).")
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    def _queue(self, guild_id, user_id, create=False):
+        key = (guild_id, user_id)
+        legacy = self._legacy.get(user_id)
+        if legacy:
+            self._adopt(guild_id, user_id, legacy)
+        if create:
+            return self._queues.setdefault(key, {})
+        return self._queues.get(key)
+
+    def _adopt(self, guild_id, user_id, legacy):
+        for item in list(legacy):
+            channel = self.bot.get_channel(item[0])
+            if channel is None or channel.guild.id != guild_id:
+                continue
+            del legacy[item]
+            self._queues.setdefault((guild_id, user_id), {})[item] = None
+            self._pending.append(("UPDATE move_queue SET guild_id = ? WHERE user_id = ? AND channel_id = ? AND message_id = ?", (guild_id, user_id, *item)))
+        if not legacy:
+            del self._legacy[user_id]
+
+    def add(self, guild_id, user_id, channel_id, message_id):
+        """Returns 'added', 'duplicate' or 'full'."""
+        queue = self._queue(guild_id, user_id, create=True)
+        item = (channel_id, message_id)
+        if item in queue:
+            return 'duplicate'
+        if len(queue) >= self.max_size:
+            return 'full'
+        queue[item] = None
+        self._pending.append(("INSERT OR IGNORE INTO move_queue (guild_id, user_id, channel_id, message_id, position) VALUES (?, ?, ?, ?, ?)", (guild_id, user_id, channel_id, message_id, self._next_position)))
+        self._next_position += 1
+        return 'added'
+
+    def items(self, guild_id, user_id):
+        return list(self._queue(guild_id, user_id) or ())
+
+    def count(self, guild_id, user_id):
+        return len(self._queue(guild_id, user_id) or ())
+
+    def clear(self, guild_id, user_id):
+        self._queue(guild_id, user_id)
+        self._queues.pop((guild_id, user_id), None)
+        self._pending.append(("DELETE FROM move_queue WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)))
+
+    def remove(self, guild_id, user_id, items):
+        """Drops the given items, keeping anything queued since they were read."""
+        queue = self._queue(guild_id, user_id)
+        if queue is None:
+            return
+        for channel_id, message_id in items:
+            if (channel_id, message_id) in queue:
+                del queue[(channel_id, message_id)]
+                self._pending.append(("DELETE FROM move_queue WHERE user_id = ? AND channel_id = ? AND message_id = ?", (user_id, channel_id, message_id)))
+        if not queue:
+            del self._queues[(guild_id, user_id)]
+
+    async def flush(self):
+        if not self._pending or self.bot.config.db is None:
+            return
+        pending, self._pending = self._pending, []
+        try:
+            for query, params in pending:
+                await self.bot.config.db.execute(query, params)
+            await self.bot.config.db.commit()
+        except Exception:
+            # Keep the changes (in order) for the next attempt.
+            self._pending = pending + self._pending
+            raise
+        self.bot.backups.request()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[MOVE_QUEUE_STORE][FLUSH] ❌ Failed to write queue changes: {e}")
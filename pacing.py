@@ -0,0 +1,138 @@
+# pacing.py
+
+import re
+import asyncio
+import datetime
+import aiohttp
+import discord
+import metrics
+
+# Routes we pace, keyed by (lane kind, major parameter). Discord buckets webhook
+# executes per webhook and message deletes per channel, so that's what we key on.
+ROUTE_PATTERNS = [
+    ('POST', re.compile(r'/webhooks/(\d+)/[^/]+$'), 'send'),
+    ('POST', re.compile(r'/channels/(\d+)/messages$'), 'send'),
+    ('POST', re.compile(r'/channels/(\d+)/messages/bulk[-_]delete$'), 'bulk_delete'),
+    ('DELETE', re.compile(r'/channels/(\d+)/messages/(\d+)$'), 'delete'),
+]
+
+# Deleting messages older than two weeks has its own, much stricter budget.
+OLD_MESSAGE_AGE = datetime.timedelta(days=14)
+
+MAX_PENALTY = 8.0
+PENALTY_DECAY = 0.9
+
+
+def classify_route(method, path):
+    """Returns the (kind, key) lane for a request, or None if we don't pace it."""
+    for route_method, pattern, kind in ROUTE_PATTERNS:
+        if method != route_method:
+            continue
+        match = pattern.search(path)
+        if match:
+            if kind == 'delete' and is_old_message(int(match.group(2))):
+                kind = 'delete_old'
+            return kind, int(match.group(1))
+    return None
+
+
+def is_old_message(message_id, margin=datetime.timedelta()):
+    """True if the message is (or within `margin` will be) too old for the bulk-delete endpoint."""
+    return discord.utils.snowflake_time(message_id) < discord.utils.utcnow() - OLD_MESSAGE_AGE + margin
+
+
+class _Lane:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.last_at = 0.0
+        self.next_at = 0.0
+        self.interval = 0.0
+        self.penalty = 1.0
+
+
+class TransferPacer:
+    """Paces sends and deletes from the rate-limit headers Discord returns.
+
+    Every request made through the bot's HTTP session is observed through an
+    aiohttp trace. Each lane spreads the remaining requests of its bucket over
+    the time left until the bucket resets, and backs off when we hit a 429.
+    """
+
+    def __init__(self):
+        self._lanes = {}
+        self._global_until = 0.0
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_request_end.append(self._on_request_end)
+
+    def _lane(self, kind, key):
+        lane = self._lanes.get((kind, key))
+        if lane is None:
+            lane = self._lanes[(kind, key)] = _Lane()
+        return lane
+
+    async def wait(self, kind, key):
+        """Waits until the lane may issue its next request."""
+        loop = asyncio.get_running_loop()
+        lane = self._lane(kind, key)
+        async with lane.lock:
+            delay = max(lane.next_at, self._global_until) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lane.last_at = loop.time()
+            lane.next_at = lane.last_at + lane.interval * lane.penalty
+
+    def ready_in(self, kind, key):
+        """Seconds until the lane may issue its next request (0 if it may right now)."""
+        lane = self._lanes.get((kind, key))
+        next_at = max(lane.next_at if lane else 0.0, self._global_until)
+        return max(0.0, next_at - asyncio.get_running_loop().time())
+
+    def observe(self, method, path, status, headers):
+        """Feeds a response's rate-limit headers back into the matching lane."""
+        route = classify_route(method, path)
+        now = asyncio.get_running_loop().time()
+
+        if status == 429:
+            retry_after = _to_float(headers.get('Retry-After'))
+            # Only a missing header means "unknown"; 0 is a real (if tiny) wait.
+            if retry_after is None:
+                retry_after = 1.0
+            route_name = metrics.route_label(method, path)
+            metrics.rate_limited.inc(route=route_name)
+            metrics.retry_after_seconds.inc(retry_after, route=route_name)
+            if headers.get('X-RateLimit-Global'):
+                self._global_until = max(self._global_until, now + retry_after)
+                print(f"[PACING][429] Global rate limit hit. Pausing all lanes for {retry_after:.2f}s.")
+            if route is None:
+                return
+            lane = self._lane(*route)
+            lane.penalty = min(lane.penalty * 2, MAX_PENALTY)
+            lane.next_at = max(lane.next_at, now + retry_after)
+            print(f"[PACING][429] {route[0]} lane {route[1]} rate limited. Backing off {retry_after:.2f}s (penalty x{lane.penalty:.1f}).")
+            return
+
+        if route is None:
+            return
+        remaining = _to_float(headers.get('X-RateLimit-Remaining'))
+        reset_after = _to_float(headers.get('X-RateLimit-Reset-After'))
+        if remaining is None or reset_after is None:
+            return
+
+        lane = self._lane(*route)
+        lane.penalty = max(1.0, lane.penalty * PENALTY_DECAY)
+        if remaining <= 0:
+            lane.interval = reset_after
+            lane.next_at = max(lane.next_at, now + reset_after)
+        else:
+            lane.interval = reset_after / remaining
+            lane.next_at = lane.last_at + lane.interval * lane.penalty
+
+    async def _on_request_end(self, session, trace_ctx, params):
+        self.observe(params.method, params.url.path, params.response.status, params.response.headers)
+
+
+def _to_float(value):
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,98 @@
+# profiling.py
+
+import os
+import time
+import random
+import logging
+from contextlib import contextmanager
+
+# Print a line per moved message with the time each stage took for it.
+TRACE_MOVES = os.getenv('TRACE_MOVES', 'false').lower() == 'true'
+# Percentiles are computed from a uniform sample of at most this many timings per stage.
+MAX_SAMPLES = 10_000
+STAGES = ('history', 'attachment', 'send', 'delete', 'pacing')
+
+# A child of the 'discord' logger, so it ends up in the LOG_PATH file.
+logger = logging.getLogger('discord.moveit.profiling')
+
+
+class _Stage:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(seconds)
+        else:
+            # Reservoir sampling keeps the sample uniform over the whole job.
+            i = random.randrange(self.count)
+            if i < MAX_SAMPLES:
+                self.samples[i] = seconds
+
+    def percentile(self, p):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class StageTimer:
+    """Collects how long each stage of a move takes: cumulative, p50/p95 and max.
+
+    Stages overlap (history and attachments are prefetched while the previous message
+    is sent), so the totals can add up to more than the job's wall time.
+    """
+
+    def __init__(self, trace=TRACE_MOVES):
+        self.trace = trace
+        self.started = time.perf_counter()
+        self._stages = {}
+        self._since_trace = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self._stages.setdefault(name, _Stage()).add(seconds)
+            if self.trace:
+                self._since_trace[name] = self._since_trace.get(name, 0.0) + seconds
+
+    def trace_message(self, message_id):
+        """With tracing on, prints the stage times spent since the previous traced message."""
+        if not self.trace:
+            return
+        parts = " ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in self._since_trace.items())
+        print(f"[PROFILING][TRACE] message {message_id}: {parts}")
+        self._since_trace = {}
+
+    def summary_lines(self):
+        lines = []
+        for name in STAGES + tuple(sorted(set(self._stages) - set(STAGES))):
+            stage = self._stages.get(name)
+            if stage is None:
+                continue
+            lines.append(f"{name:<10} {stage.count:>6}x {stage.total:8.2f}s  p50 {stage.percentile(50) * 1000:7.1f}ms  p95 {stage.percentile(95) * 1000:7.1f}ms  max {stage.max * 1000:7.1f}ms")
+        return lines
+
+    def summary(self):
+        """A compact multi-line summary, sized for an embed field."""
+        lines = self.summary_lines()
+        if not lines:
+            return "No timings recorded."
+        return "```\n" + "\n".join(lines) + f"\nwall       {time.perf_counter() - self.started:8.2f}s\n```"
+
+    def log(self, label):
+        wall = time.perf_counter() - self.started
+        logger.info("%s finished in %.2fs; stage timings:\n%s", label, wall, "\n".join(self.summary_lines()))
+        print(f"[PROFILING][SUMMARY] {label} finished in {wall:.2f}s.")
+        for line in self.summary_lines():
+            print(f"[PROFILING][SUMMARY]   {line}")
@@ -0,0 +1,492 @@
+# transfer.py
+
+import os
+import time
+import asyncio
+import collections
+import datetime
+import discord
+import metrics
+from pacing import is_old_message
+from jobs import CHECKPOINT_INTERVAL, JobCancelled
+from attachments import MAX_ATTACHMENT_SIZE, SPOOL_THRESHOLD
+from profiling import StageTimer
+
+# How many messages the producer may run ahead of the one currently being sent.
+PREFETCH_DEPTH = int(os.getenv('PREFETCH_DEPTH', '5'))
+# Delete moved originals in batches through the bulk-delete endpoint instead of one by one.
+BULK_DELETE = os.getenv('BULK_DELETE', 'true').lower() == 'true'
+BULK_DELETE_CHUNK = 100
+# Don't hand the bulk endpoint anything that could cross the 14 day line while in flight.
+BULK_DELETE_MARGIN = datetime.timedelta(minutes=10)
+# Discord's limits for a single (webhook) message, which a compacted post has to respect.
+MAX_CONTENT_LENGTH = 2000
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+MAX_FILES = 10
+# Total upload size of a compacted post. One attachment may already be this large, so a
+# compacted post never asks more of the upload limit than a single moved message does.
+MAX_UPLOAD_SIZE = MAX_ATTACHMENT_SIZE
+
+_DONE = object()
+
+
+class TransferError(Exception):
+    """Raised when a message could not be moved. `position` is 1-based."""
+    def __init__(self, position, original):
+        super().__init__(str(original))
+        self.position = position
+        self.original = original
+
+
+async def _as_async_iter(messages):
+    if hasattr(messages, '__aiter__'):
+        async for message in messages:
+            yield message
+    else:
+        for message in messages:
+            yield message
+
+
+async def prepend(first, rest):
+    """Re-attaches a message that was peeked off the front of a history stream."""
+    yield first
+    async for message in rest:
+        yield message
+
+
+class DeferredDeleter:
+    """Collects moved message IDs per source channel and deletes them in batches.
+
+    Messages younger than 14 days go through `delete_messages` in chunks of 100.
+    Older ones can't be bulk deleted and fall back to single deletes, which the
+    pacer keeps in their own `delete_old` lane.
+    """
+
+    def __init__(self, bot, *, ignore_errors=False, timer=None):
+        self.bot = bot
+        self.ignore_errors = ignore_errors
+        self.timer = timer or StageTimer(trace=False)
+        self._pending = {}
+
+    async def add(self, message):
+        channel, ids = self._pending.setdefault(message.channel.id, (message.channel, []))
+        ids.append(message.id)
+        if len(ids) >= BULK_DELETE_CHUNK:
+            await self._flush_channel(channel.id)
+
+    async def flush(self):
+        for channel_id in list(self._pending):
+            await self._flush_channel(channel_id)
+
+    async def _flush_channel(self, channel_id):
+        channel, ids = self._pending.pop(channel_id)
+        recent, singles = [], []
+        for message_id in ids:
+            (singles if is_old_message(message_id, BULK_DELETE_MARGIN) else recent).append(message_id)
+        if len(recent) < 2:
+            singles += recent
+            recent = []
+        try:
+            if recent:
+                with self.timer.stage('pacing'):
+                    await self.bot.pacer.wait('bulk_delete', channel.id)
+                with self.timer.stage('delete'):
+                    await channel.delete_messages([discord.Object(id=message_id) for message_id in recent])
+                metrics.messages_deleted.inc(len(recent))
+            for message_id in singles:
+                kind = 'delete_old' if is_old_message(message_id) else 'delete'
+                with self.timer.stage('pacing'):
+                    await self.bot.pacer.wait(kind, channel.id)
+                try:
+                    with self.timer.stage('delete'):
+                        await channel.get_partial_message(message_id).delete()
+                    metrics.messages_deleted.inc()
+                except discord.NotFound:
+                    pass
+        except (discord.NotFound, discord.Forbidden):
+            if not self.ignore_errors:
+                raise
+
+
+class MessageTransfer:
+    """Reposts messages into a destination and deletes the originals, in order.
+
+    A producer task pages through the source and starts the attachment downloads
+    for up to `prefetch` messages ahead, while the consumer sends the current one.
+    The queue between them is FIFO, so the send order is always the source order.
+    With `bulk_delete`, originals are removed in batches by a DeferredDeleter.
+
+    When a `job` is given, its progress is checkpointed every CHECKPOINT_INTERVAL
+    messages, once the originals up to that point have actually been deleted. The
+    job is also consulted between messages, so it can be paused or cancelled. A paused
+    job stops prefetching and gives its downloads (and memory budget) back; they are
+    fetched again on resume.
+
+    With `compact`, consecutive regular messages from the same author are packed into
+    one webhook post (each line keeps its original timestamp) as long as the post stays
+    within Discord's content, embed and file limits.
+
+    When the registry has a webhook pool for the destination, posts rotate through it,
+    always to the webhook whose rate limit frees up first. Posts still go out one at a
+    time, each waiting for Discord to confirm the created message, so the destination
+    order is the send order. Each confirmed ID must be newer than the previous one; if
+    not, or if a pooled webhook breaks, the rest of the move uses the single webhook.
+    """
+
+    def __init__(self, bot, destination, webhook, *, job=None, prefetch=PREFETCH_DEPTH, ignore_delete_errors=False, bulk_delete=BULK_DELETE, compact=False):
+        self.bot = bot
+        self.destination = destination
+        self.webhook = webhook
+        self.prefetch = max(1, prefetch)
+        self.ignore_delete_errors = ignore_delete_errors
+        self.timer = StageTimer()
+        self.deleter = DeferredDeleter(bot, ignore_errors=ignore_delete_errors, timer=self.timer) if bulk_delete else None
+        self.job = job
+        self.compact = compact
+        self.moved_count = job.moved_count if job else 0
+        self.webhooks = [webhook]
+        self._rotation = 0
+        self._last_post_id = 0
+        self._last_done_id = None
+        self._since_commit = 0
+        # Cleared while a pause hands back prefetched downloads, until they are re-reserved in order.
+        self._prefetching = asyncio.Event()
+        self._prefetching.set()
+
+    async def run(self, messages) -> int:
+        if self.bot.webhooks.pool_size > 1:
+            try:
+                self.webhooks = await self.bot.webhooks.pool(self.destination)
+                self.webhook = self.webhooks[0]
+            except discord.HTTPException as e:
+                print(f"[TRANSFER][POOL] Could not set up a webhook pool, using one webhook: {e}")
+        queue = asyncio.Queue(maxsize=self.prefetch)
+        producer = asyncio.create_task(self._produce(messages, queue))
+        position = 0
+        # Compact mode only: same-author messages waiting to go out as one post.
+        batch = []
+        # Prefetched items whose downloads were given back while the job was paused.
+        held = collections.deque()
+        try:
+            while True:
+                if self.job and self.job.paused:
+                    await self._hold_while_paused(queue, held, batch)
+                if self.job:
+                    await self.job.gate()
+                item = self._refetch(held.popleft()) if held else await queue.get()
+                if isinstance(item, JobCancelled):
+                    raise item
+                if item is _DONE or isinstance(item, Exception):
+                    if batch:
+                        pending, batch = batch, []
+                        await self._send_batch(pending, position - len(pending) + 1)
+                    if item is _DONE:
+                        break
+                    raise TransferError(position + 1, item)
+                message, download = item
+                position += 1
+                if self.compact:
+                    if batch and not self._fits(batch, message):
+                        pending, batch = batch, []
+                        await self._send_batch(pending, position - len(pending))
+                    if self._compactable(message):
+                        batch.append((message, download))
+                        continue
+                try:
+                    await self._move(message, download)
+                    await self._done(message)
+                except Exception as e:
+                    raise TransferError(position, e) from e
+            try:
+                await self._commit()
+            except Exception as e:
+                raise TransferError(position, e) from e
+        except (TransferError, JobCancelled):
+            # Whatever was already reposted must still be removed from the source.
+            try:
+                await self._commit()
+            except Exception as e:
+                print(f"[TRANSFER][COMMIT] ❌ Failed to delete moved originals after an abort: {e}")
+            raise
+        finally:
+            producer.cancel()
+            for _, download in batch:
+                if download is not None:
+                    self._discard(download)
+            while not queue.empty():
+                held.append(queue.get_nowait())
+            for item in held:
+                if isinstance(item, tuple) and item[1] is not None:
+                    self._discard(item[1])
+            self.timer.log(f"Job {self.job.id} ({self.job.kind})" if self.job else "Transfer")
+        return self.moved_count
+
+    async def _hold_while_paused(self, queue, held, batch):
+        """Waits out a pause without holding any downloads, so other moves keep their share of the budget."""
+        self._prefetching.clear()
+        batch[:] = [self._unfetch(item) for item in batch]
+        while self.job.paused:
+            while not queue.empty():
+                held.append(self._unfetch(queue.get_nowait()))
+            # The producer may still hand over the item it was putting when the pause came.
+            unpaused = asyncio.create_task(self.job.wait_unpaused())
+            item = asyncio.create_task(queue.get())
+            try:
+                await asyncio.wait((unpaused, item), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                unpaused.cancel()
+                item.cancel()
+            if item.done() and not item.cancelled():
+                held.append(self._unfetch(item.result()))
+        if self.job.cancel_requested:
+            return
+        # Re-reserve in message order before the producer may start anything newer.
+        batch[:] = [self._refetch(item) for item in batch]
+        for i in range(len(held)):
+            held[i] = self._refetch(held[i])
+        self._prefetching.set()
+
+    def _unfetch(self, item):
+        if isinstance(item, tuple) and item[1] is not None:
+            self._discard(item[1])
+            return (item[0], None)
+        return item
+
+    def _refetch(self, item):
+        """Restarts the download of an item whose download was given back during a pause."""
+        if isinstance(item, tuple) and item[1] is None and item[0].attachments:
+            return (item[0], asyncio.create_task(self._download(item[0])))
+        return item
+
+    async def _done(self, message):
+        """Books a moved (and deleted or queued for deletion) message towards the next checkpoint."""
+        self._last_done_id = message.id
+        self._since_commit += 1
+        self.timer.trace_message(message.id)
+        if self.job:
+            self.job.moved_count = self.moved_count
+        if self.job and self._since_commit >= CHECKPOINT_INTERVAL:
+            await self._commit()
+
+    async def _send_batch(self, batch, first_position):
+        """Sends a compact batch; the batch's downloads are owned (and cleaned up) from here on."""
+        try:
+            if len(batch) == 1:
+                await self._move(*batch[0])
+            else:
+                await self._move_compacted(batch)
+            for message, _ in batch:
+                await self._done(message)
+        except Exception as e:
+            raise TransferError(first_position, e) from e
+
+    async def _commit(self):
+        if self.deleter:
+            await self.deleter.flush()
+        if self.job and self._last_done_id and self._since_commit:
+            await self.bot.job_store.checkpoint(self.job, self._last_done_id, self.moved_count)
+        self._since_commit = 0
+
+    async def _produce(self, messages, queue):
+        try:
+            iterator = _as_async_iter(messages)
+            while True:
+                with self.timer.stage('history'):
+                    message = await anext(iterator, _DONE)
+                if message is _DONE:
+                    break
+                if self.job:
+                    # A paused job must not start downloads; they would hold budget other moves need.
+                    await self.job.gate()
+                    await self._prefetching.wait()
+                download = asyncio.create_task(self._download(message)) if message.attachments else None
+                await queue.put((message, download))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(_DONE)
+
+    @staticmethod
+    def _content_with_links(message):
+        """The message text, with links for the attachments that are too large to re-upload."""
+        content_with_links = message.content
+        for attachment in message.attachments:
+            if attachment.size > MAX_ATTACHMENT_SIZE:
+                content_with_links += f"\n\n**(Attachment too large to move:** `{attachment.filename}`\n{attachment.url} **)**"
+        return content_with_links
+
+    @staticmethod
+    def _compact_line(message, first):
+        # The first line carries the full date, the rest only the time of day.
+        style = 'f' if first else 't'
+        return f"<t:{int(message.created_at.timestamp())}:{style}> {MessageTransfer._content_with_links(message)}"
+
+    @staticmethod
+    def _compactable(message):
+        return not message.webhook_id and bool(message.content or message.attachments or message.embeds)
+
+    def _fits(self, batch, message):
+        """Whether `message` can join the batch without breaking the single-post limits."""
+        if not self._compactable(message) or message.author.id != batch[0][0].author.id:
+            return False
+        messages = [m for m, _ in batch] + [message]
+        length = sum(len(self._compact_line(m, i == 0)) for i, m in enumerate(messages)) + len(messages) - 1
+        embeds = [embed for m in messages for embed in m.embeds]
+        embed_chars = sum(len(embed) for embed in embeds)
+        files = [a for m in messages for a in m.attachments if a.size <= MAX_ATTACHMENT_SIZE]
+        upload_size = sum(a.size for a in files)
+        # A batch holds its downloads until it is sent, so keep it well inside the shared memory budget.
+        in_memory = sum(a.size for a in files if a.size <= SPOOL_THRESHOLD)
+        return (length <= MAX_CONTENT_LENGTH and len(embeds) <= MAX_EMBEDS and embed_chars <= MAX_EMBED_CHARS
+                and len(files) <= MAX_FILES and upload_size <= MAX_UPLOAD_SIZE and in_memory <= self.bot.attachments.budget.limit // 4)
+
+    async def _download(self, message):
+        content_with_links = self._content_with_links(message)
+        to_fetch = [attachment for attachment in message.attachments if attachment.size <= MAX_ATTACHMENT_SIZE]
+        if not to_fetch:
+            return content_with_links, []
+        # fetch_all cleans up after itself if it fails or is cancelled.
+        with self.timer.stage('attachment'):
+            spooled = await self.bot.attachments.fetch_all(to_fetch)
+        return content_with_links, spooled
+
+    def _discard(self, download):
+        """Drops a prefetched download that will never be sent, giving back its memory budget."""
+        if not download.done():
+            download.cancel()
+        elif not download.cancelled() and download.exception() is None:
+            self.bot.attachments.release(download.result()[1])
+
+    async def _move(self, message, download):
+        # Define the message state as a tuple for pattern matching
+        message_state = (bool(message.content), bool(message.attachments), bool(message.embeds), bool(message.webhook_id))
+        if download and message_state[3]:
+            # Webhook messages are quoted, their attachments are never re-uploaded.
+            self._discard(download)
+
+        match message_state:
+            # Case 1: Any message from a webhook
+            case (_, _, _, True):
+                quote_embed = discord.Embed(description=message.content, timestamp=message.created_at)
+                quote_embed.set_author(name=message.author.display_name, icon_url=message.author.display_avatar.url)
+                quote_embed.set_footer(text=f"Original message from #{message.channel.name}")
+                await self._pace('send', self.destination.id)
+                with self.timer.stage('send'):
+                    self._check_order(await self.destination.send(embeds=[quote_embed] + message.embeds))
+                self.moved_count += 1
+                metrics.messages_moved.inc()
+
+            # Case 2: A regular user message with any combination of content, embeds, or attachments
+            case (True, _, _, False) | (_, True, _, False) | (_, _, True, False):
+                content_with_links, spooled = await download if download else (message.content, [])
+                await self._webhook_send(message.author, content_with_links, message.embeds, spooled)
+                self.moved_count += 1
+                metrics.messages_moved.inc()
+
+            # Case 3 (Default): An unsendable message (e.g., sticker).
+            case _:
+                print(f"Skipping unsendable message (ID: {message.id}).")
+                metrics.messages_skipped.inc()
+
+        await self._delete_original(message)
+
+    async def _move_compacted(self, batch):
+        """Reposts several same-author messages as one post, then removes the originals."""
+        downloaded = []
+        try:
+            for message, download in batch:
+                downloaded.append(await download if download else (message.content, []))
+        except BaseException:
+            # The failed download has cleaned up after itself; give back the rest.
+            for _, spooled in downloaded:
+                self.bot.attachments.release(spooled)
+            for _, download in batch[len(downloaded) + 1:]:
+                if download is not None:
+                    self._discard(download)
+            raise
+
+        content = "\n".join(self._compact_line(message, i == 0) for i, (message, _) in enumerate(batch))
+        embeds = [embed for message, _ in batch for embed in message.embeds]
+        spooled = [item for _, items in downloaded for item in items]
+        await self._webhook_send(batch[0][0].author, content, embeds, spooled)
+        self.moved_count += len(batch)
+        metrics.messages_moved.inc(len(batch))
+        for message, _ in batch:
+            await self._delete_original(message)
+
+    async def _webhook_send(self, author, content, embeds, spooled):
+        """Posts as `author` through the webhook. The spooled attachments are released afterwards."""
+        try:
+            send_kwargs = {
+                'content': content,
+                'username': author.display_name,
+                'avatar_url': author.display_avatar.url,
+                'embeds': embeds,
+                'files': [item.to_file() for item in spooled]
+            }
+            if isinstance(self.destination, discord.Thread):
+                send_kwargs['thread'] = self.destination
+
+            webhook = self._next_webhook()
+            await self._pace('send', webhook.id)
+            try:
+                self._check_order(await self._timed_send(webhook, send_kwargs))
+            except discord.NotFound:
+                # The cached webhook was deleted behind our back. Re-create it and try once more.
+                self.webhook = await self.bot.webhooks.refresh(self.destination)
+                if len(self.webhooks) > 1:
+                    print(f"[TRANSFER][POOL] A pooled webhook in #{self.destination.name} is gone. Continuing with one webhook.")
+                self.webhooks = [self.webhook]
+                send_kwargs['files'] = [item.to_file() for item in spooled]
+                await self._pace('send', self.webhook.id)
+                self._check_order(await self._timed_send(self.webhook, send_kwargs))
+        finally:
+            self.bot.attachments.release(spooled)
+
+    def _next_webhook(self):
+        """The pooled webhook that may post soonest; ties go round-robin."""
+        if len(self.webhooks) == 1:
+            return self.webhooks[0]
+        count = len(self.webhooks)
+        candidates = [self.webhooks[(self._rotation + i) % count] for i in range(count)]
+        webhook = min(candidates, key=lambda candidate: self.bot.pacer.ready_in('send', candidate.id))
+        self._rotation = (self.webhooks.index(webhook) + 1) % count
+        return webhook
+
+    def _check_order(self, posted):
+        """Makes sure the post landed after the previous one, or stops using the pool."""
+        if posted is None:
+            return
+        if posted.id <= self._last_post_id and len(self.webhooks) > 1:
+            print(f"[TRANSFER][POOL] ❌ Post {posted.id} landed before {self._last_post_id} in #{self.destination.name}. Continuing with one webhook.")
+            self.webhooks = [self.webhook]
+        self._last_post_id = max(self._last_post_id, posted.id)
+
+    async def _delete_original(self, message):
+        if self.deleter:
+            await self.deleter.add(message)
+            return
+        try:
+            await self._pace('delete_old' if is_old_message(message.id) else 'delete', message.channel.id)
+            with self.timer.stage('delete'):
+                await message.delete()
+            metrics.messages_deleted.inc()
+        except (discord.NotFound, discord.Forbidden):
+            if not self.ignore_delete_errors:
+                raise
+
+    async def _pace(self, kind, key):
+        with self.timer.stage('pacing'):
+            await self.bot.pacer.wait(kind, key)
+
+    async def _timed_send(self, webhook, send_kwargs):
+        """Sends through `webhook`. With a pool, waits for (and returns) the created message."""
+        started = time.perf_counter()
+        try:
+            with self.timer.stage('send'):
+                return await webhook.send(**send_kwargs, wait=len(self.webhooks) > 1)
+        finally:
+            metrics.webhook_send_seconds.observe(time.perf_counter() - started)
@@ -0,0 +1,106 @@
+# webhook_registry.py
+
+import os
+import asyncio
+import discord
+
+WEBHOOK_NAME = "MoveIt"
+# Keep the MoveIt webhook for each channel in the DB so restarts don't have to list webhooks again.
+PERSIST_WEBHOOKS = os.getenv('PERSIST_WEBHOOKS', 'false').lower() == 'true'
+# How many MoveIt webhooks to spread a move's reposts over. Each webhook has its own rate
+# limit, so a pool raises the ceiling for large moves. Discord allows 15 per channel.
+WEBHOOK_POOL_SIZE = max(1, min(int(os.getenv('WEBHOOK_POOL_SIZE', '1')), 10))
+
+
+class WebhookRegistry:
+    """Caches the MoveIt webhook of every channel we move messages into.
+
+    Webhooks always live on the parent channel, so threads share their parent's
+    entry. A cached webhook is only dropped when Discord says it no longer exists
+    (see `refresh`), which is the only time we list or create webhooks again.
+
+    With a `pool_size` above 1, `pool` also provides the extra webhooks ("MoveIt 2",
+    "MoveIt 3", ...) a move may rotate through. Pools are only cached in memory.
+    """
+
+    def __init__(self, bot, persist=PERSIST_WEBHOOKS, pool_size=WEBHOOK_POOL_SIZE):
+        self.bot = bot
+        self.persist = persist
+        self.pool_size = pool_size
+        self._webhooks = {}
+        self._pools = {}
+        self._locks = {}
+
+    async def load(self):
+        if not self.persist:
+            return
+        rows = await self.bot.config.db.fetchall("SELECT channel_id, webhook_id, webhook_token FROM webhooks")
+        for row in rows:
+            self._webhooks[row['channel_id']] = discord.Webhook.partial(row['webhook_id'], row['webhook_token'], client=self.bot)
+        print(f"[WEBHOOK_REGISTRY][LOAD] Restored {len(rows)} cached webhook(s).")
+
+    async def get(self, channel) -> discord.Webhook:
+        parent = channel.parent if isinstance(channel, discord.Thread) else channel
+        webhook = self._webhooks.get(parent.id)
+        if webhook is not None:
+            return webhook
+
+        lock = self._locks.setdefault(parent.id, asyncio.Lock())
+        async with lock:
+            # Another move into the same channel may have resolved it while we waited.
+            webhook = self._webhooks.get(parent.id)
+            if webhook is None:
+                webhooks = await parent.webhooks()
+                webhook = discord.utils.get(webhooks, name=WEBHOOK_NAME) or await parent.create_webhook(name=WEBHOOK_NAME)
+                await self._store(parent.id, webhook)
+        return webhook
+
+    async def pool(self, channel) -> list[discord.Webhook]:
+        """The channel's webhook pool, led by its regular MoveIt webhook.
+
+        If Discord won't let us create the extra webhooks (missing permission, or the
+        channel is at its webhook limit), the pool is just whatever we have.
+        """
+        primary = await self.get(channel)
+        parent = channel.parent if isinstance(channel, discord.Thread) else channel
+        pool = self._pools.get(parent.id)
+        if pool is not None and pool[0] is primary:
+            return pool
+
+        async with self._locks.setdefault(parent.id, asyncio.Lock()):
+            pool = self._pools.get(parent.id)
+            if pool is None or pool[0] is not primary:
+                pool = [primary]
+                if self.pool_size > 1:
+                    existing = {webhook.name: webhook for webhook in await parent.webhooks()}
+                    for n in range(2, self.pool_size + 1):
+                        name = f"{WEBHOOK_NAME} {n}"
+                        webhook = existing.get(name)
+                        if webhook is None:
+                            try:
+                                webhook = await parent.create_webhook(name=name)
+                            except discord.HTTPException as e:
+                                print(f"[WEBHOOK_REGISTRY][POOL] Could not create webhook {name!r} in #{parent.name}: {e}. Using {len(pool)}.")
+                                break
+                        pool.append(webhook)
+                self._pools[parent.id] = pool
+        return pool
+
+    async def refresh(self, channel) -> discord.Webhook:
+        """Drops the cached webhook after a NotFound and resolves (or re-creates) it."""
+        parent = channel.parent if isinstance(channel, discord.Thread) else channel
+        await self.invalidate(parent.id)
+        return await self.get(parent)
+
+    async def invalidate(self, channel_id):
+        self._webhooks.pop(channel_id, None)
+        self._pools.pop(channel_id, None)
+        if self.persist:
+            await self.bot.config.db.execute("DELETE FROM webhooks WHERE channel_id = ?", (channel_id,))
+            await self.bot.config.db.commit()
+
+    async def _store(self, channel_id, webhook):
+        self._webhooks[channel_id] = webhook
+        if self.persist and webhook.token:
+            await self.bot.config.db.execute("INSERT OR REPLACE INTO webhooks (channel_id, webhook_id, webhook_token) VALUES (?, ?, ?)", (channel_id, webhook.id, webhook.token))
+            await self.bot.config.db.commit()